@@ -1,10 +1,14 @@
 from flask import Flask, request
 from .config import Config
 from .extensions import db, cors
+from .schema import ensure_columns
 
 
 
-def create_app():
+def create_app(start_background=False):
+    """The Flask app. Only the serving entrypoints (run.py, wsgi.py) pass
+    `start_background`, which starts the similarity refresher and the GLB job
+    runner; CLIs, benchmarks and job pool processes never run them."""
     app = Flask(__name__)
     app.config.from_object(Config)
 
@@ -36,7 +40,10 @@ def create_app():
                     "X-Mobile-Request",
                     "X-Connection-Type",
                     "X-Retry-Count",
+                    "Range",
+                    "If-Range",
                 ],
+                "expose_headers": ["Content-Range", "Accept-Ranges", "Content-Length", "ETag"],
             }
         },
     )
@@ -47,7 +54,8 @@ def create_app():
         if origin in allowed_origins:
             response.headers["Access-Control-Allow-Origin"] = origin
         response.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS, PUT, DELETE"
-        response.headers["Access-Control-Allow-Headers"] = "Content-Type, Accept, Authorization, X-Requested-With, Origin, X-Mobile-Request, X-Connection-Type, X-Retry-Count"
+        response.headers["Access-Control-Allow-Headers"] = "Content-Type, Accept, Authorization, X-Requested-With, Origin, X-Mobile-Request, X-Connection-Type, X-Retry-Count, Range, If-Range"
+        response.headers["Access-Control-Expose-Headers"] = "Content-Range, Accept-Ranges, Content-Length, ETag"
         response.headers["Access-Control-Max-Age"] = "86400"
         response.headers["Access-Control-Allow-Credentials"] = "true"
         response.headers.pop("Cross-Origin-Opener-Policy", None)
@@ -74,5 +82,13 @@ def create_app():
     # create tables
     with app.app_context():
         db.create_all()
+        ensure_columns()
+
+    if start_background:
+        from .similar_artworks import start_similarity_refresher
+        start_similarity_refresher(app)
+
+        from .jobs import start_glb_job_runner
+        start_glb_job_runner(app)
 
     return app
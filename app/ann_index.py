@@ -0,0 +1,219 @@
+"""
+Approximate nearest-neighbour index over artwork colour histograms.
+
+Random-hyperplane LSH: histograms are mapped to sqrt-normalised vectors
+(so cosine tracks the Bhattacharyya coefficient, a close proxy for histogram
+intersection), centred, and hashed into `n_tables` tables of `n_bits`-bit
+buckets. A query only looks at the artworks sharing a bucket with it, ranked
+by how many tables they collide in.
+
+Used by the recommender when RECOMMENDATION_MODE = "approximate". The index
+is saved to ANN_INDEX_PATH and rebuilt with:
+    python -m app.ann_index
+"""
+
+import os
+import argparse
+import threading
+import numpy as np
+
+from .features import HISTOGRAM_BINS
+
+
+class HistogramLSH:
+    def __init__(self, n_tables=8, n_bits=12, seed=0, dim=HISTOGRAM_BINS, mean=None, planes=None):
+        if n_bits > 62:
+            raise ValueError("n_bits must fit in a signed 64-bit bucket key")
+        rng = np.random.default_rng(seed)
+        self.n_tables = n_tables
+        self.n_bits = n_bits
+        self.planes = (
+            planes if planes is not None
+            else rng.standard_normal((dim, n_tables * n_bits)).astype(np.float32)
+        )
+        self.mean = mean if mean is not None else np.full(dim, 1.0 / np.sqrt(dim), dtype=np.float32)
+        self._powers = (1 << np.arange(n_bits, dtype=np.int64))
+        self.tables = [{} for _ in range(n_tables)]
+        self.keys = {}  # artwork_id -> bucket key per table
+        self._synced_engine = None
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, artwork_id):
+        return artwork_id in self.keys
+
+    @staticmethod
+    def _normalise(matrix):
+        matrix = np.atleast_2d(np.asarray(matrix, dtype=np.float32))
+        totals = matrix.sum(axis=1, keepdims=True)
+        return np.sqrt(matrix / np.maximum(totals, 1e-12))
+
+    def fit_mean(self, histograms):
+        """Centre hyperplanes on the data so buckets split the catalog evenly."""
+        if len(histograms):
+            self.mean = self._normalise(histograms).mean(axis=0)
+
+    def hash(self, histograms):
+        """Bucket keys, shape (n, n_tables), for one or more histograms."""
+        projected = (self._normalise(histograms) - self.mean) @ self.planes
+        bits = (projected > 0).reshape(-1, self.n_tables, self.n_bits)
+        return bits @ self._powers
+
+    def add_many(self, artwork_ids, histograms):
+        if len(artwork_ids) == 0:
+            return
+        keys = self.hash(histograms)
+        with self._lock:
+            for artwork_id, row in zip(artwork_ids, keys):
+                self._insert(int(artwork_id), row)
+
+    def add(self, artwork_id, histogram):
+        self.add_many([artwork_id], histogram)
+
+    def _insert(self, artwork_id, row_keys):
+        self._remove(artwork_id)
+        row_keys = tuple(int(k) for k in row_keys)
+        self.keys[artwork_id] = row_keys
+        for table, key in zip(self.tables, row_keys):
+            table.setdefault(key, set()).add(artwork_id)
+
+    def _remove(self, artwork_id):
+        row_keys = self.keys.pop(artwork_id, None)
+        if row_keys is None:
+            return
+        for table, key in zip(self.tables, row_keys):
+            bucket = table.get(key)
+            if bucket is not None:
+                bucket.discard(artwork_id)
+                if not bucket:
+                    del table[key]
+
+    def remove(self, artwork_id):
+        with self._lock:
+            self._remove(artwork_id)
+
+    def query(self, histogram, limit=500):
+        """Candidate artwork ids, most table collisions first."""
+        keys = self.hash(histogram)[0]
+        with self._lock:
+            hits = {}
+            for table, key in zip(self.tables, keys):
+                for artwork_id in table.get(int(key), ()):
+                    hits[artwork_id] = hits.get(artwork_id, 0) + 1
+        if len(hits) <= limit:
+            return list(hits)
+        return sorted(hits, key=hits.get, reverse=True)[:limit]
+
+    def sync(self, engine):
+        """Bring the index in line with a SimilarityEngine's catalog.
+
+        Cheap when only a few artworks changed, which lets workers that did
+        not handle an upload themselves catch up lazily.
+        """
+        if self._synced_engine is engine:
+            return
+        with self._lock:
+            engine_ids = set(engine.ids.tolist())
+            for artwork_id in set(self.keys) - engine_ids:
+                self._remove(artwork_id)
+            missing = list(engine_ids - set(self.keys))
+        if missing:
+            rows = engine.rows_of(missing)
+            has_hist = engine.has_histogram[rows]
+            self.add_many(engine.ids[rows[has_hist]], engine.histograms[rows[has_hist]])
+        self._synced_engine = engine
+
+    def save(self, path):
+        with self._lock:
+            ids = np.array(list(self.keys), dtype=np.int64)
+            keys = np.array([self.keys[i] for i in ids.tolist()], dtype=np.int64).reshape(-1, self.n_tables)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, planes=self.planes, mean=self.mean, n_bits=self.n_bits, ids=ids, keys=keys)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            planes = data["planes"]
+            n_bits = int(data["n_bits"])
+            index = cls(
+                n_tables=planes.shape[1] // n_bits, n_bits=n_bits,
+                dim=planes.shape[0], mean=data["mean"], planes=planes,
+            )
+            for artwork_id, row_keys in zip(data["ids"].tolist(), data["keys"]):
+                index._insert(artwork_id, row_keys)
+        return index
+
+
+def build_ann_index(engine, n_tables=8, n_bits=12):
+    index = HistogramLSH(n_tables=n_tables, n_bits=n_bits)
+    has_hist = engine.has_histogram
+    index.fit_mean(engine.histograms[has_hist])
+    index.add_many(engine.ids[has_hist], engine.histograms[has_hist])
+    return index
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_ann_index(engine, config):
+    """Process-wide index, loaded from disk (or built) on first use and
+    synced with `engine` so it covers exactly the same catalog."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            path = config.get("ANN_INDEX_PATH")
+            if path and os.path.exists(path):
+                try:
+                    _index = HistogramLSH.load(path)
+                except Exception as e:
+                    print(f"Could not load ANN index from {path}: {e}")
+            if _index is None:
+                _index = build_ann_index(
+                    engine, n_tables=config.get("ANN_TABLES", 8), n_bits=config.get("ANN_BITS", 12)
+                )
+        index = _index
+    index.sync(engine)
+    return index
+
+
+def add_to_ann_index(artwork_id, histogram):
+    """Incremental insert from the upload path (no-op until the index is in use)."""
+    if _index is not None and histogram is not None:
+        _index.add(artwork_id, histogram)
+
+
+def remove_from_ann_index(artwork_id):
+    if _index is not None:
+        _index.remove(artwork_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the approximate recommendation index")
+    parser.add_argument("--tables", type=int, default=None)
+    parser.add_argument("--bits", type=int, default=None)
+    args = parser.parse_args()
+
+    from . import create_app
+    from .similarity import build_engine
+
+    app = create_app()
+    with app.app_context():
+        engine = build_engine()
+        index = build_ann_index(
+            engine,
+            n_tables=args.tables or app.config["ANN_TABLES"],
+            n_bits=args.bits or app.config["ANN_BITS"],
+        )
+        path = app.config["ANN_INDEX_PATH"]
+        index.save(path)
+
+    print(f"Indexed {len(index)} artworks into {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,55 +1,31 @@
 import io
-import numpy as np
-import trimesh
+import os
+import json
 from PIL import Image
-from flask import Blueprint, request, send_file, abort, Response, jsonify
+from flask import Blueprint, request, Response, jsonify, current_app
 from datetime import datetime
+from sqlalchemy.orm import load_only
 
+from .assets import asset_url, send_artwork_file
 from .auth import get_current_user
+from .blobs import store_image
+from .catalog import bump_catalog_version, current_catalog_version
 from .extensions import db
-from .models import Artwork
-from .recommendations import recommend_similar_artworks
+from .imaging import MIN_DECODE_SIDE, draft_decode
+from .ingest import ingest_image
+from .jobs import enqueue_glb_job, job_info, notify_glb_jobs
+from .palette import get_color_index, parse_hex
+from .models import Artwork, GlbJob
+from .recommendations import (
+    artwork_deleted, artwork_saved, recommend_batch, recommend_similar_artworks,
+    recommendation_cache_stats, search_similar_image,
+)
+from .similar_artworks import (
+    materialized_recommendations, pending_refresh_count, queue_similarity_refresh,
+)
 
 artworks_bp = Blueprint("artworks", __name__)
 
-def create_glb_from_image(file_like, width_m=0.6, thickness_m=0.01):
-    try:
-        img = Image.open(file_like).convert("RGB")
-
-        from PIL import ImageEnhance
-        img = ImageEnhance.Contrast(img).enhance(1.2)
-        img = ImageEnhance.Color(img).enhance(1.1)
-
-        w_px, h_px = img.size
-        if w_px == 0 or h_px == 0:
-            raise ValueError("Invalid image dimensions")
-
-        aspect = h_px / float(w_px)
-
-        W = float(width_m)
-        H = W * aspect
-        T = float(thickness_m)
-
-        box = trimesh.creation.box(extents=(W, H, T))
-        box.apply_translation((0, 0, T / 2.0))
-
-        uv = np.zeros((len(box.vertices), 2), dtype=np.float32)
-        verts = box.vertices
-        min_xy = verts[:, :2].min(axis=0)
-        max_xy = verts[:, :2].max(axis=0)
-        span_xy = np.maximum(max_xy - min_xy, 1e-8)
-        uv[:] = (verts[:, :2] - min_xy) / span_xy
-
-        texture = trimesh.visual.texture.TextureVisuals(uv=uv, image=img)
-        box.visual = texture
-
-        glb_bytes = box.export(file_type="glb")
-        return glb_bytes if isinstance(glb_bytes, bytes) else glb_bytes.read()
-
-    except Exception as e:
-        print(f"Error in create_glb_from_image: {str(e)}")
-        return None
-
 @artworks_bp.route("/health", methods=["GET", "OPTIONS"])
 def health_check():
     if request.method == "OPTIONS":
@@ -137,15 +113,6 @@ def make_glb():
         year_created = int(year_created_str) if year_created_str else None
 
         image_data = f.read()
-        glb_bytes = create_glb_from_image(io.BytesIO(image_data))
-
-        if not glb_bytes:
-            return Response(
-                '{"success": false, "error": "Failed to process image. Please try a different image."}',
-                mimetype="application/json",
-                status=500,
-            )
-
         artwork = Artwork(
             name=name,
             description=description,
@@ -156,17 +123,29 @@ def make_glb():
             dimensions=dimensions,
             medium=medium,
             style=style,
-            image_data=image_data,
-            glb_data=glb_bytes,
             filename=f.filename,
             user_id=user.id,  # ✅ assign owner
         )
+        if current_app.config.get("GLB_JOBS_ENABLED", True):
+            return _queue_upload(artwork, image_data, f.content_type)
+
+        timings = ingest_image(artwork, image_data, f.content_type)
+        if timings is None:
+            return Response(
+                '{"success": false, "error": "Failed to process image. Please try a different image."}',
+                mimetype="application/json",
+                status=500,
+            )
 
         db.session.add(artwork)
+        db.session.flush()
+        catalog_version = bump_catalog_version(artwork.id)
+        queue_similarity_refresh(artwork.id)
         db.session.commit()
+        artwork_saved(artwork, catalog_version)
 
         return Response(
-            f'{{"success": true, "artwork_id": {artwork.id}}}',
+            json.dumps({"success": True, "artwork_id": artwork.id, "timings_ms": timings}),
             mimetype="application/json",
             status=200,
         )
@@ -180,21 +159,59 @@ def make_glb():
         )
 
 
+def _queue_upload(artwork, image_data, content_type):
+    """Store the original and queue the GLB build (app/jobs.py): 202 + job id."""
+    try:
+        # decode it all (at the smallest draft scale) so a truncated or corrupt
+        # file is a 400 here rather than a failed job
+        with Image.open(io.BytesIO(image_data)) as img:
+            artwork.image_width, artwork.image_height = img.size
+            mime = Image.MIME.get(img.format) or content_type
+            draft_decode(img, MIN_DECODE_SIDE)
+    except Exception:
+        return Response(
+            '{"success": false, "error": "Failed to process image. Please try a different image."}',
+            mimetype="application/json",
+            status=400,
+        )
+
+    store_image(artwork, image_data, mime)
+    db.session.add(artwork)
+    db.session.flush()
+    job_id = enqueue_glb_job(artwork.id).id
+    catalog_version = bump_catalog_version(artwork.id)
+    db.session.commit()
+    artwork_saved(artwork, catalog_version)
+    notify_glb_jobs()
+
+    # reported as queued: the runner may already have claimed it since the notify
+    status_url = f"/api/jobs/{job_id}"
+    return Response(
+        json.dumps({
+            "success": True, "artwork_id": artwork.id, "job_id": job_id,
+            "status": "queued", "status_url": status_url,
+        }),
+        mimetype="application/json",
+        status=202,
+        headers={"Location": status_url},
+    )
+
+
+@artworks_bp.route("/api/jobs/<int:job_id>", methods=["GET"])
+def glb_job_status(job_id):
+    job = db.session.get(GlbJob, job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Job not found"}), 404
+    return jsonify({"success": True, "job": job_info(job)})
+
+
 @artworks_bp.route("/artwork/<int:artwork_id>/image")
 def artwork_image(artwork_id):
-    art = Artwork.query.get_or_404(artwork_id)
-    img_bytes = getattr(art, "image_data", None) or getattr(art, "image", None)
-    if not img_bytes:
-        abort(404, "Image not found")
-    return send_file(io.BytesIO(img_bytes), mimetype="image/png", download_name=f"artwork-{artwork_id}.png")
+    return send_artwork_file(artwork_id, "image")
 
 @artworks_bp.route("/artwork/<int:artwork_id>/glb")
 def artwork_glb(artwork_id):
-    art = Artwork.query.get_or_404(artwork_id)
-    glb_bytes = getattr(art, "glb_data", None) or getattr(art, "glb", None)
-    if not glb_bytes:
-        abort(404, "GLB not found")
-    return send_file(io.BytesIO(glb_bytes), mimetype="model/gltf-binary", download_name=f"artwork-{artwork_id}.glb")
+    return send_artwork_file(artwork_id, "glb")
 
 @artworks_bp.route("/api/artwork/<int:artwork_id>", methods=["GET"])
 def get_artwork_api(artwork_id):
@@ -212,6 +229,8 @@ def get_artwork_api(artwork_id):
         "style": artwork.style,
         "created_at": artwork.created_at.isoformat() if artwork.created_at else None,
         "filename": artwork.filename,
+        "image_url": asset_url(artwork, "image"),
+        "glb_url": asset_url(artwork, "glb"),
     })
 
 @artworks_bp.route("/artworks", methods=["GET"])
@@ -231,6 +250,7 @@ def list_artworks():
             "medium": a.medium,
             "style": a.style,
             "created_at": a.created_at.isoformat() if a.created_at else None,
+            "image_url": asset_url(a, "image"),
 
             "is_sold": a.is_sold,
 
@@ -262,6 +282,7 @@ def seller_artworks():
         "medium": a.medium,
         "style": a.style,
         "created_at": a.created_at.isoformat() if a.created_at else None,
+        "image_url": asset_url(a, "image"),
 
         "is_sold": a.is_sold,
 
@@ -293,7 +314,10 @@ def update_artwork(artwork_id):
         if "style" in data:
             artwork.style = data["style"].strip()
 
+        catalog_version = bump_catalog_version(artwork.id)
+        queue_similarity_refresh(artwork.id)
         db.session.commit()
+        artwork_saved(artwork, catalog_version)
 
         return jsonify({
             "success": True,
@@ -325,7 +349,10 @@ def delete_artwork(artwork_id):
         artwork_name = artwork.name
 
         db.session.delete(artwork)
+        catalog_version = bump_catalog_version(artwork_id)
+        queue_similarity_refresh(artwork_id)
         db.session.commit()
+        artwork_deleted(artwork_id, catalog_version)
 
         return jsonify({
             "success": True,
@@ -338,6 +365,109 @@ def delete_artwork(artwork_id):
 
 @artworks_bp.route("/api/artwork/<int:artwork_id>/recommendations", methods=["GET"])
 def artwork_recommendations(artwork_id):
-    art = Artwork.query.get_or_404(artwork_id)
+    if current_app.config.get("RECOMMENDATION_SOURCE") == "materialized":
+        stored = materialized_recommendations(artwork_id, top_n=6)
+        if stored is not None:
+            pending = pending_refresh_count()
+            return jsonify(dict(
+                stored, artwork_id=artwork_id, source="materialized",
+                stale=pending > 0, pending_refresh=pending,
+            ))
+
+    art = Artwork.query.options(load_only(Artwork.id)).get_or_404(artwork_id)
     recs = recommend_similar_artworks(art, top_n=6)
-    return jsonify({"artwork_id": artwork_id, "recommendations": recs})
+    return jsonify({"artwork_id": artwork_id, "recommendations": recs, "source": "live"})
+
+MAX_BATCH_RECOMMENDATIONS = 100
+
+@artworks_bp.route("/api/recommendations/batch", methods=["POST"])
+def batch_recommendations():
+    data = request.get_json(silent=True) or {}
+    artwork_ids = data.get("artwork_ids")
+    if not isinstance(artwork_ids, list) or not artwork_ids:
+        return jsonify({"success": False, "error": "artwork_ids must be a non-empty list"}), 400
+    if len(artwork_ids) > MAX_BATCH_RECOMMENDATIONS:
+        return jsonify({
+            "success": False,
+            "error": f"At most {MAX_BATCH_RECOMMENDATIONS} artwork_ids per request",
+        }), 400
+    try:
+        artwork_ids = list(dict.fromkeys(int(i) for i in artwork_ids))
+        top_n = min(max(int(data.get("top_n", 6)), 1), 50)
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "error": "artwork_ids and top_n must be integers"}), 400
+
+    results = recommend_batch(artwork_ids, top_n=top_n)
+    return jsonify({
+        "success": True,
+        "recommendations": {str(i): results[i] for i in artwork_ids if i in results},
+        "not_found": [i for i in artwork_ids if i not in results],
+    })
+
+@artworks_bp.route("/api/recommendations/cache-stats", methods=["GET"])
+def recommendations_cache_stats():
+    # Counters are per gunicorn worker; the pid tells responses apart.
+    return jsonify(dict(recommendation_cache_stats(), worker_pid=os.getpid()))
+
+MAX_SEARCH_RESULTS = 50
+
+@artworks_bp.route("/api/search/similar-image", methods=["POST"])
+def similar_image_search():
+    f = request.files.get("image")
+    if f is None or f.filename == "":
+        return jsonify({"success": False, "error": "No image uploaded"}), 400
+    try:
+        limit = min(max(int(request.form.get("limit", 12)), 1), MAX_SEARCH_RESULTS)
+    except ValueError:
+        return jsonify({"success": False, "error": "limit must be an integer"}), 400
+    only_unsold = request.form.get("only_unsold", "false").lower() in ("1", "true", "yes")
+
+    results, timings = search_similar_image(f.read(), limit=limit, only_unsold=only_unsold)
+    if results is None:
+        return jsonify({"success": False, "error": "Could not decode the uploaded image"}), 400
+    return jsonify({"success": True, "results": results, "timings_ms": timings})
+
+MAX_COLOR_RESULTS = 200
+
+@artworks_bp.route("/api/artworks/by-color", methods=["GET"])
+def artworks_by_color():
+    rgb = parse_hex(request.args.get("hex"))
+    if rgb is None:
+        return jsonify({"success": False, "error": "hex must be a colour like ff8800 or #f80"}), 400
+    try:
+        tolerance = min(max(float(request.args.get("tolerance", 20)), 0.0), 100.0)
+        limit = min(max(int(request.args.get("limit", 50)), 1), MAX_COLOR_RESULTS)
+    except ValueError:
+        return jsonify({"success": False, "error": "tolerance and limit must be numbers"}), 400
+    include_sold = request.args.get("include_sold", "false").lower() in ("1", "true", "yes")
+
+    matches = get_color_index(current_catalog_version()).query(
+        rgb, tolerance=tolerance, only_unsold=not include_sold, limit=limit
+    )
+    artworks = {
+        a.id: a for a in
+        Artwork.query.options(
+            load_only(Artwork.id, Artwork.name, Artwork.artist, Artwork.price, Artwork.is_sold)
+        ).filter(Artwork.id.in_([m[0] for m in matches]))
+    }
+    results = []
+    for artwork_id, (r, g, b), weight, distance in matches:
+        a = artworks.get(artwork_id)
+        if a is None:
+            continue
+        results.append({
+            "id": a.id,
+            "name": a.name,
+            "artist": a.artist,
+            "price": a.price,
+            "is_sold": a.is_sold,
+            "matched_color": f"#{r:02x}{g:02x}{b:02x}",
+            "color_weight": round(weight, 3),
+            "distance": round(distance, 2),
+        })
+    return jsonify({
+        "success": True,
+        "color": "#%02x%02x%02x" % rgb,
+        "tolerance": tolerance,
+        "artworks": results,
+    })
@@ -0,0 +1,486 @@
+"""
+Serving stored artwork files (images and GLB models).
+
+BLOB_SERVE_MODE selects who moves the bytes:
+
+* ``direct``     - the worker sends the file itself. send_file() hands an open
+                   file to the server's wsgi.file_wrapper, which gunicorn turns
+                   into sendfile(2), so the bytes never pass through Python.
+* ``x-accel``    - empty response with ``X-Accel-Redirect``; nginx serves the
+                   file from an ``internal`` location mapped to BLOB_STORE_ROOT
+                   (BLOB_ACCEL_PREFIX) and the worker is free immediately.
+* ``x-sendfile`` - same idea with ``X-Sendfile`` and the absolute path
+                   (Apache mod_xsendfile, lighttpd).
+
+Example nginx location for x-accel with the default prefix::
+
+    location /_blobs/ {
+        internal;
+        alias /app/blobs/;
+    }
+
+Rows not yet moved to the blob store are streamed from SQLite with
+incremental blob I/O (send_inline_blob), BLOB_CHUNK_SIZE bytes at a time.
+
+Caching: the content hash is a strong ETag and the asset's modified time is
+Last-Modified, both read from the row, so a revalidation that matches is
+answered 304 without opening the file or the blob column. URLs carrying the
+content hash (``?v=<hash prefix>``, see asset_url) never change content and
+are marked immutable; plain URLs must be revalidated.
+
+``/artwork/<id>/image?w=320`` serves a cached thumbnail (app/thumbnails.py)
+at the next allowed width. Clients whose Accept header names image/avif or
+image/webp get that encoding instead of the original's (``Vary: Accept``).
+Each variant has its own ETag. GLBs are sent brotli- or gzip-encoded
+(app/compression.py) when Accept-Encoding allows and it pays
+(``Vary: Accept-Encoding``), and at a lighter level of detail
+(app/glb.py) for ``?lod=`` or the mobile / connection-type client hints.
+
+Single byte ranges (Range / If-Range, 206) are supported on every path:
+send_file seeks in the stored file, nginx or Apache handle them in the
+offload modes, and inline blobs read only the requested span.
+"""
+
+import io
+import os
+import sqlite3
+import mimetypes
+from datetime import timezone
+from flask import Response, abort, current_app, jsonify, request, send_file
+from sqlalchemy import func
+from sqlalchemy.orm import load_only
+
+from .blobs import get_blob_store
+from .compression import available_encodings, compressed_key, get_compressed, worth_sending
+from .extensions import db
+from .glb import (
+    DEFAULT_THICKNESS_M, DEFAULT_WIDTH_M, allowed_thickness, allowed_width, build_missing_glb, get_lod_glb,
+    lod_for_client, lod_key, parse_dimensions, quantize_width, texture_policy, width_steps,
+)
+from .jobs import pending_glb_job
+from .models import Artwork
+from .thumbnails import ENCODERS, available_formats, get_image_variant, thumbnail_width, variant_key
+
+SERVE_MODES = ("direct", "x-accel", "x-sendfile")
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+VERSION_PREFIX_LENGTH = 16
+
+# kind -> (hash, mime, modified, size, legacy inline column, default mime)
+ASSET_COLUMNS = {
+    "image": (
+        Artwork.image_sha256, Artwork.image_mime, Artwork.image_modified_at, Artwork.image_size,
+        Artwork.image_data, "image/png",
+    ),
+    "glb": (
+        Artwork.glb_sha256, Artwork.glb_mime, Artwork.glb_modified_at, Artwork.glb_size,
+        Artwork.glb_data, "model/gltf-binary",
+    ),
+}
+
+# Connection.blobopen is new in Python 3.11
+_HAS_BLOBOPEN = hasattr(sqlite3.Connection, "blobopen")
+
+
+def asset_url(artwork, kind):
+    """Path of an artwork's image or GLB, versioned by content hash when known."""
+    url = f"/artwork/{artwork.id}/{kind}"
+    digest = getattr(artwork, ASSET_COLUMNS[kind][0].key)
+    return f"{url}?v={digest[:VERSION_PREFIX_LENGTH]}" if digest else url
+
+
+def send_blob(digest, mimetype, download_name, last_modified=None):
+    store = get_blob_store()
+    path = store.path(digest)
+    if not os.path.exists(path):
+        abort(404, "File missing from blob store")
+
+    mode = current_app.config.get("BLOB_SERVE_MODE", "direct")
+    if mode == "direct":
+        return send_file(
+            path, mimetype=mimetype, download_name=download_name,
+            etag=digest, last_modified=last_modified,
+        )
+
+    response = Response(status=200, mimetype=mimetype)
+    response.headers["Content-Disposition"] = f'inline; filename="{download_name}"'
+    if mode == "x-accel":
+        prefix = current_app.config.get("BLOB_ACCEL_PREFIX", "/_blobs/").rstrip("/")
+        relative = os.path.relpath(path, store.root).replace(os.sep, "/")
+        response.headers["X-Accel-Redirect"] = f"{prefix}/{relative}"
+    elif mode == "x-sendfile":
+        response.headers["X-Sendfile"] = os.path.abspath(path)
+    else:
+        raise ValueError(f"Unknown BLOB_SERVE_MODE: {mode}")
+    return response
+
+
+def _iter_sqlite_blob(engine, table, column, rowid, start, stop, chunk_size):
+    """Yield bytes [start, stop) of the blob, one chunk per pooled-connection checkout.
+
+    An open blob handle keeps a read lock on the database, so it is held only
+    while a chunk is copied, never while the client is receiving it. Seeking
+    in a reopened handle walks the overflow pages again, which is why chunks
+    should not be too small.
+    """
+    offset = start
+    while offset < stop:
+        conn = engine.raw_connection()
+        try:
+            with conn.driver_connection.blobopen(table, column, rowid, readonly=True) as blob:
+                blob.seek(offset)
+                chunk = blob.read(min(chunk_size, stop - offset))
+        finally:
+            conn.close()
+        if not chunk:
+            return
+        offset += len(chunk)
+        yield chunk
+
+
+def _range_still_valid(etag, last_modified):
+    """If-Range: honour Range only if the client's copy is still current."""
+    if_range = request.if_range
+    if if_range.etag is not None:
+        return etag is not None and if_range.etag == etag
+    if if_range.date is not None:
+        return (
+            last_modified is not None
+            and last_modified.replace(microsecond=0, tzinfo=timezone.utc) == if_range.date
+        )
+    return True
+
+
+def _requested_range(length, etag=None, last_modified=None):
+    """(start, stop) for a satisfiable single Range, None to send everything,
+    or False when the range cannot be satisfied (416)."""
+    requested = request.range
+    if requested is None or len(requested.ranges) != 1 or requested.units != "bytes":
+        return None
+    if not _range_still_valid(etag, last_modified):
+        return None
+    span = requested.range_for_length(length)
+    return span if span is not None else False
+
+
+def send_inline_blob(column, artwork_id, mimetype, download_name, last_modified=None):
+    """Stream a blob still stored in the artwork row (`column` is e.g.
+    Artwork.glb_data) with memory bounded by BLOB_CHUNK_SIZE.
+
+    Content-Length comes from SQL length(), which SQLite answers from the
+    record header without reading the blob. A single byte Range is served as
+    206 and only that span is read.
+    """
+    length = db.session.query(func.length(column)).filter(Artwork.id == artwork_id).scalar()
+    if not length:
+        abort(404, "File not found")
+
+    engine = db.engine
+    if not _HAS_BLOBOPEN or engine.dialect.name != "sqlite":
+        data = db.session.query(column).filter(Artwork.id == artwork_id).scalar()
+        return send_file(
+            io.BytesIO(data), mimetype=mimetype, download_name=download_name,
+            last_modified=last_modified,
+        )
+
+    span = _requested_range(length, last_modified=last_modified)
+    if span is False:
+        response = Response(status=416)
+        response.headers["Content-Range"] = f"bytes */{length}"
+        return response
+    start, stop = span or (0, length)
+
+    chunk_size = current_app.config.get("BLOB_CHUNK_SIZE", 1 << 20)
+    body = _iter_sqlite_blob(engine, Artwork.__table__.name, column.key, artwork_id, start, stop, chunk_size)
+    response = Response(body, status=206 if span else 200, mimetype=mimetype, direct_passthrough=True)
+    response.headers["Content-Length"] = str(stop - start)
+    if span:
+        response.headers["Content-Range"] = f"bytes {start}-{stop - 1}/{length}"
+    response.headers["Content-Disposition"] = f'inline; filename="{download_name}"'
+    return response
+
+
+def _not_modified(etag, last_modified):
+    """True when the request's validators show the client's copy of the
+    representation with `etag` is current."""
+    if request.if_none_match:
+        # If-None-Match wins over If-Modified-Since (RFC 9110 13.2.2)
+        return bool(etag) and request.if_none_match.contains_weak(etag)
+    since = request.if_modified_since
+    if since is not None and last_modified is not None:
+        return last_modified.replace(microsecond=0, tzinfo=timezone.utc) <= since
+    return False
+
+
+def _requested_width(kind, digest):
+    """Allowed thumbnail width for ?w=, or None for full size."""
+    requested = request.args.get("w")
+    if kind != "image" or not requested or not digest:
+        return None
+    try:
+        requested = int(requested)
+    except ValueError:
+        abort(400, "w must be an integer")
+    if requested <= 0:
+        abort(400, "w must be positive")
+    return thumbnail_width(requested, current_app.config["THUMBNAIL_WIDTHS"])
+
+
+def _negotiated_format(kind, digest, mimetype):
+    """First of IMAGE_FORMATS the client names in Accept, or None to keep
+    the original's format. Wildcards do not count: browsers send */* for
+    images whatever they can decode."""
+    if kind != "image" or not digest:
+        return None
+    accepted = {value for value, quality in request.accept_mimetypes if quality > 0}
+    available = available_formats()
+    for fmt in current_app.config.get("IMAGE_FORMATS", []):
+        if fmt in available and ENCODERS[fmt][1] in accepted and ENCODERS[fmt][1] != mimetype:
+            return fmt
+    return None
+
+
+def _negotiated_encoding(kind, digest):
+    """First of GLB_ENCODINGS allowed by Accept-Encoding, or None for identity."""
+    if kind != "glb" or not digest:
+        return None
+    available = available_encodings()
+    for encoding in current_app.config.get("GLB_ENCODINGS", []):
+        if encoding in available and request.accept_encodings[encoding] > 0:
+            return encoding
+    return None
+
+
+def _requested_lod(kind, art):
+    """Texture side of the GLB level of detail to serve, or None for the stored GLB.
+
+    ``?lod=<px>`` (rounded up to GLB_LOD_SIDES, ``full`` for the stored GLB)
+    wins over the X-Mobile-Request / X-Connection-Type client hints.
+    """
+    config = current_app.config
+    sides = config.get("GLB_LOD_SIDES")
+    if kind != "glb" or not sides or not art.image_sha256:
+        return None
+    requested = request.args.get("lod")
+    if requested == "full":
+        return None
+    if requested:
+        try:
+            requested = int(requested)
+        except ValueError:
+            abort(400, "lod must be an integer or 'full'")
+        if requested <= 0:
+            abort(400, "lod must be positive")
+        side = thumbnail_width(requested, sides)
+    else:
+        mobile = request.headers.get("X-Mobile-Request", "false") == "true"
+        side = lod_for_client(mobile, request.headers.get("X-Connection-Type"), config)
+    if side is None or side >= texture_policy(config)["max_side"]:
+        return None
+    return side
+
+
+def _metres(name):
+    try:
+        value = float(request.args[name])
+    except ValueError:
+        abort(400, f"{name} must be a number of metres")
+    return value
+
+
+def _requested_size(kind, art):
+    """(width_m, thickness_m) of the frame to serve, or None for the stored GLB's.
+
+    ``?width_m=`` must be a multiple of GLB_WIDTH_STEP_M between
+    GLB_MIN_WIDTH_M and GLB_MAX_WIDTH_M and ``?thickness_m=`` one of
+    GLB_THICKNESSES_M, so a few cached variants answer every request.
+    ``width_m=actual`` takes the width from the artwork's ``dimensions``,
+    rounded to the nearest allowed one (the default width if it has none).
+    """
+    if kind != "glb" or not art.image_sha256:
+        return None
+    if "width_m" not in request.args and "thickness_m" not in request.args:
+        return None
+    config = current_app.config
+    width, thickness = DEFAULT_WIDTH_M, DEFAULT_THICKNESS_M
+    if request.args.get("width_m") == "actual":
+        landscape = art.image_width >= art.image_height if art.image_width and art.image_height else None
+        parsed = parse_dimensions(art.dimensions, landscape)
+        if parsed:
+            width = quantize_width(parsed, config)
+    elif "width_m" in request.args:
+        width = _metres("width_m")
+        if not allowed_width(width, config):
+            low, high, step = width_steps(config)
+            abort(400, f"width_m must be a multiple of {step} from {low} to {high}, or 'actual'")
+        width = quantize_width(width, config)
+    if "thickness_m" in request.args:
+        thickness = _metres("thickness_m")
+        if not allowed_thickness(thickness, config):
+            allowed = ", ".join(str(t) for t in config.get("GLB_THICKNESSES_M", []))
+            abort(400, f"thickness_m must be one of {allowed}")
+    if (width, thickness) == (DEFAULT_WIDTH_M, DEFAULT_THICKNESS_M):
+        return None
+    return width, thickness
+
+
+def _glb_key(art, digest, lod, encoding, frame=None):
+    """Cache key (and ETag) of the GLB representation a request would get."""
+    key = digest
+    if lod or frame:
+        policy = texture_policy()
+        key = lod_key(art.image_sha256, lod or policy["max_side"], policy,
+                      *(frame or (DEFAULT_WIDTH_M, DEFAULT_THICKNESS_M)))
+    return compressed_key(key, encoding) if encoding else key
+
+
+def _send_glb(art, digest, lod, encoding, mimetype, download_name, last_modified, frame=None):
+    """GLB at a level of detail or frame size and/or precompressed, or None to
+    send the stored file as is (compression does not pay, or the build failed)."""
+    config = current_app.config
+    store = get_blob_store()
+    path, key, size = store.path(digest), digest, art.glb_size
+    if lod or frame:
+        side = lod or texture_policy(config)["max_side"]
+        try:
+            path, key, generation_ms = get_lod_glb(
+                art.image_sha256, store.path(art.image_sha256), side, config,
+                *(frame or (DEFAULT_WIDTH_M, DEFAULT_THICKNESS_M)),
+            )
+        except ValueError as e:
+            print(f"GLB variant: {e}")
+            return None
+        size = os.path.getsize(path)
+        if generation_ms is not None:
+            print(f"GLB variant {key[:12]}{key[64:]} for artwork {art.id}: {art.glb_size} -> {size} bytes "
+                  f"in {generation_ms:.1f} ms")
+
+    content_encoding = None
+    if encoding:
+        compressed_path, compressed, generation_ms = get_compressed(key, path, encoding, config)
+        compressed_size = os.path.getsize(compressed_path)
+        if generation_ms is not None:
+            print(f"Compressed GLB {key[:12]}{key[64:]} ({encoding}): {size} -> {compressed_size} bytes "
+                  f"in {generation_ms:.1f} ms")
+        if worth_sending(compressed_size, size, config):
+            path, key, content_encoding = compressed_path, compressed, encoding
+
+    if key == digest:
+        return None
+    # Content-Length is the encoded size; ranges apply to the encoded bytes
+    response = send_file(path, mimetype=mimetype, download_name=download_name, etag=key, last_modified=last_modified)
+    if content_encoding:
+        response.headers["Content-Encoding"] = content_encoding
+    if lod:
+        response.headers["X-GLB-LOD"] = str(lod)
+    if frame:
+        response.headers["X-GLB-Width-M"] = str(frame[0])
+        response.headers["X-GLB-Thickness-M"] = str(frame[1])
+    return response
+
+
+def _send_variant(art, digest, width, fmt, last_modified):
+    """Resized and/or re-encoded image response, or None when the original
+    should be served (nothing to change, or the variant came out larger)."""
+    variant = get_image_variant(digest, get_blob_store().path(digest), current_app.config, width, fmt)
+    if variant is None:
+        return None
+    path, mimetype, key, generation_ms = variant
+    size = os.path.getsize(path)
+    if generation_ms is not None:
+        print(f"Image variant {key[:12]}{key[64:]}: {art.image_size} -> {size} bytes in {generation_ms:.1f} ms")
+    if art.image_size and size >= art.image_size:
+        return None
+
+    response = send_file(path, mimetype=mimetype, etag=key, last_modified=last_modified)
+    response.headers["X-Derivative-Cache"] = "miss" if generation_ms is not None else "hit"
+    if art.image_size:
+        response.headers["X-Original-Bytes"] = str(art.image_size)
+        response.headers["X-Bytes-Saved"] = str(art.image_size - size)
+    if generation_ms is not None:
+        response.headers["X-Derivative-Generation-Ms"] = f"{generation_ms:.1f}"
+    return response
+
+
+def send_artwork_file(artwork_id, kind):
+    """Serve an artwork's image or GLB with validators and caching headers."""
+    hash_col, mime_col, modified_col, size_col, inline_col, default_mime = ASSET_COLUMNS[kind]
+    art = Artwork.query.options(
+        load_only(
+            Artwork.id, Artwork.created_at, Artwork.image_sha256, Artwork.image_width, Artwork.image_height,
+            Artwork.dimensions, hash_col, mime_col, modified_col, size_col,
+        )
+    ).get_or_404(artwork_id)
+    generation_ms = None
+    if kind == "glb" and art.glb_sha256 is None and art.image_sha256:
+        if current_app.config.get("GLB_GENERATION") == "lazy":
+            _, generation_ms = build_missing_glb(artwork_id)
+        else:
+            job = pending_glb_job(artwork_id)
+            if job is not None:
+                # the upload's job builds it; never on the request path in eager mode
+                status_url = f"/api/jobs/{job.id}"
+                return jsonify({
+                    "success": False, "error": "The 3D model is still being built",
+                    "job_id": job.id, "status": job.status, "status_url": status_url,
+                }), 202, {"Location": status_url, "Retry-After": "2"}
+    digest = getattr(art, hash_col.key)
+    last_modified = getattr(art, modified_col.key) or art.created_at
+    mimetype = getattr(art, mime_col.key) or default_mime
+
+    version = request.args.get("v")
+    immutable = bool(version and digest and digest.startswith(version) and len(version) >= 8)
+    ext = ".glb" if kind == "glb" else (mimetypes.guess_extension(mimetype) or ".png")
+    download_name = f"artwork-{artwork_id}{ext}"
+
+    width = _requested_width(kind, digest)
+    fmt = _negotiated_format(kind, digest, mimetype)
+    lod = _requested_lod(kind, art)
+    frame = _requested_size(kind, art)
+    encoding = _negotiated_encoding(kind, digest)
+    if width or fmt:
+        etag = variant_key(digest, width, fmt, current_app.config)
+    elif lod or frame or encoding:
+        etag = _glb_key(art, digest, lod, encoding, frame)
+    else:
+        etag = digest
+
+    if _not_modified(etag, last_modified):
+        response = Response(status=304)
+    else:
+        response = None
+        if width or fmt:
+            response = _send_variant(art, digest, width, fmt, last_modified)
+        elif lod or frame or encoding:
+            response = _send_glb(art, digest, lod, encoding, mimetype, download_name, last_modified, frame)
+        if response is not None:
+            etag = response.get_etag()[0]
+        elif etag != digest and _not_modified(digest, last_modified):
+            # the variant fell back to the original, and that is the copy the client holds
+            etag, response = digest, Response(status=304)
+        else:
+            etag = digest
+            if digest:
+                response = send_blob(digest, mimetype, download_name, last_modified=last_modified)
+            else:
+                # not migrated to the blob store yet
+                response = send_inline_blob(
+                    inline_col, artwork_id, mimetype, download_name, last_modified=last_modified
+                )
+        response.headers["Accept-Ranges"] = "bytes"
+
+    if etag:
+        response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL
+    if generation_ms is not None:
+        response.headers["X-GLB-Generation-Ms"] = f"{generation_ms:.1f}"
+    if kind == "image" and current_app.config.get("IMAGE_FORMATS"):
+        response.vary.add("Accept")
+    if kind == "glb" and current_app.config.get("GLB_ENCODINGS"):
+        response.vary.add("Accept-Encoding")
+    if kind == "glb" and current_app.config.get("GLB_LOD_SIDES"):
+        response.vary.update(("X-Mobile-Request", "X-Connection-Type"))
+    return response
@@ -0,0 +1,228 @@
+"""
+Content-addressed store for artwork images and GLB models.
+
+Files live under BLOB_STORE_ROOT at ``ab/cd/<sha256>``; the Artwork row only
+keeps the hash, size and mime type. Identical uploads share one file, writes
+are atomic (temp file + rename) and a file never changes once written, so it
+can be served straight from disk.
+
+Move blobs still stored inline in artwork.db into the store (resumable, one
+committed batch at a time):
+    python -m app.blobs migrate [--batch-size N] [--vacuum]
+
+Delete files no artwork references any more:
+    python -m app.blobs gc
+"""
+
+import io
+import os
+import time
+import hashlib
+import argparse
+import tempfile
+from datetime import datetime
+from flask import current_app
+from PIL import Image
+from sqlalchemy import func, or_, text
+
+from .extensions import db
+from .models import Artwork
+
+GLB_MIME = "model/gltf-binary"
+
+
+class BlobStore:
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def exists(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def put(self, data):
+        """Store `data` and return its sha256 hex digest."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if os.path.exists(path):
+            return digest
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return digest
+
+    def open(self, digest):
+        return open(self.path(digest), "rb")
+
+    def read(self, digest):
+        with self.open(digest) as f:
+            return f.read()
+
+    def remove(self, digest):
+        try:
+            os.remove(self.path(digest))
+        except FileNotFoundError:
+            pass
+
+    def digests(self):
+        """(digest, mtime) of every stored file."""
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if not name.startswith(".tmp-"):
+                    yield name, os.path.getmtime(os.path.join(dirpath, name))
+
+
+_stores = {}
+
+
+def get_blob_store(config=None):
+    root = (config or current_app.config)["BLOB_STORE_ROOT"]
+    if root not in _stores:
+        _stores[root] = BlobStore(root)
+    return _stores[root]
+
+
+def sniff_image_mime(data, default="application/octet-stream"):
+    """Mime type from the image header (Pillow only reads the first bytes)."""
+    try:
+        return Image.MIME.get(Image.open(io.BytesIO(data)).format, default)
+    except Exception:
+        return default
+
+
+def store_image(artwork, image_data, mime=None):
+    """Put the image in the store and point `artwork` at it; the caller commits."""
+    artwork.image_sha256 = get_blob_store().put(image_data)
+    artwork.image_size = len(image_data)
+    artwork.image_mime = mime or sniff_image_mime(image_data)
+    artwork.image_modified_at = datetime.utcnow()
+    artwork.image_data = b""  # column is NOT NULL in existing databases
+
+
+def store_glb(artwork, glb_data):
+    artwork.glb_sha256 = get_blob_store().put(glb_data)
+    artwork.glb_size = len(glb_data)
+    artwork.glb_mime = GLB_MIME
+    artwork.glb_modified_at = datetime.utcnow()
+    artwork.glb_data = None
+
+
+def read_image(artwork):
+    """Original image bytes, from the store or the legacy inline column."""
+    if artwork.image_sha256:
+        return get_blob_store().read(artwork.image_sha256)
+    return artwork.image_data or None
+
+
+def read_glb(artwork):
+    if artwork.glb_sha256:
+        return get_blob_store().read(artwork.glb_sha256)
+    return artwork.glb_data or None
+
+
+def _pending_migration():
+    return db.session.query(Artwork.id).filter(or_(
+        (Artwork.image_sha256.is_(None)) & (func.length(Artwork.image_data) > 0),
+        (Artwork.glb_sha256.is_(None)) & (Artwork.glb_data.isnot(None)),
+    ))
+
+
+def migrate_blobs(batch_size=20):
+    """Move inline blobs into the store, committing after every batch.
+
+    Only `batch_size` rows' blobs are in memory at a time; an interrupted run
+    picks up where it stopped because migrated rows no longer match.
+    Returns the number of artworks migrated.
+    """
+    total = _pending_migration().count()
+    migrated = 0
+    while True:
+        ids = [row.id for row in _pending_migration().order_by(Artwork.id).limit(batch_size)]
+        if not ids:
+            break
+        rows = db.session.query(
+            Artwork.id, Artwork.image_data, Artwork.glb_data, Artwork.image_sha256, Artwork.glb_sha256,
+        ).filter(Artwork.id.in_(ids))
+        for row in rows:
+            values = {}
+            if row.image_sha256 is None and row.image_data:
+                values.update(
+                    image_sha256=get_blob_store().put(row.image_data),
+                    image_size=len(row.image_data),
+                    image_mime=sniff_image_mime(row.image_data),
+                    image_data=b"",
+                )
+            if row.glb_sha256 is None and row.glb_data is not None:
+                values.update(
+                    glb_sha256=get_blob_store().put(row.glb_data),
+                    glb_size=len(row.glb_data),
+                    glb_mime=GLB_MIME,
+                    glb_data=None,
+                )
+            db.session.query(Artwork).filter(Artwork.id == row.id).update(values, synchronize_session=False)
+        db.session.commit()
+        db.session.expunge_all()
+        migrated += len(ids)
+        print(f"Migrated {migrated}/{total} artworks")
+    return migrated
+
+
+def collect_garbage(min_age_seconds=3600):
+    """Remove stored files no artwork references.
+
+    Files younger than `min_age_seconds` are kept: they may belong to an
+    upload whose transaction has not committed yet.
+    """
+    referenced = set()
+    for image_sha256, glb_sha256 in db.session.query(Artwork.image_sha256, Artwork.glb_sha256):
+        referenced.update(d for d in (image_sha256, glb_sha256) if d)
+
+    store = get_blob_store()
+    cutoff = time.time() - min_age_seconds
+    removed = 0
+    for digest, mtime in list(store.digests()):
+        if digest not in referenced and mtime < cutoff:
+            store.remove(digest)
+            removed += 1
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the artwork blob store")
+    sub = parser.add_subparsers(dest="command", required=True)
+    migrate = sub.add_parser("migrate", help="move inline image/GLB blobs out of the database")
+    migrate.add_argument("--batch-size", type=int, default=20)
+    migrate.add_argument("--vacuum", action="store_true", help="VACUUM afterwards to shrink the database file")
+    gc = sub.add_parser("gc", help="delete stored files that no artwork references")
+    gc.add_argument("--min-age", type=int, default=3600, help="seconds; younger files are kept")
+    args = parser.parse_args()
+
+    from . import create_app
+
+    app = create_app()
+    with app.app_context():
+        if args.command == "migrate":
+            count = migrate_blobs(batch_size=args.batch_size)
+            print(f"Done: {count} artworks migrated to {app.config['BLOB_STORE_ROOT']}")
+            if args.vacuum:
+                db.session.remove()
+                with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                    conn.execute(text("VACUUM"))
+                print("Database vacuumed")
+        else:
+            removed = collect_garbage(min_age_seconds=args.min_age)
+            print(f"Removed {removed} unreferenced files")
+
+
+if __name__ == "__main__":
+    main()
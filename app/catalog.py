@@ -0,0 +1,103 @@
+"""
+Catalog version shared across gunicorn workers.
+
+Every write that can change recommendations (upload, edit, delete, sale,
+feature backfill) bumps a counter in the ``catalog_state`` table inside the
+same transaction. Per-process caches (similarity engine, text index, result
+cache) key on it, so a write handled by one worker invalidates the others on
+their next request.
+
+Each bump also records the artworks it touched in ``catalog_change``. A
+per-process index that has fallen a few versions behind re-reads just those
+(keep_current) instead of rebuilding from the whole catalog.
+"""
+
+from datetime import datetime
+
+from .extensions import db
+from .models import CatalogChange, CatalogState
+
+_ROW_ID = 1
+# versions kept in catalog_change; an index further behind is rebuilt
+CHANGE_LOG_VERSIONS = 1000
+# above this many changed artworks a rebuild is cheaper than re-reading each
+MAX_CHANGED_ARTWORKS = 500
+
+
+def current_catalog_version():
+    return db.session.query(CatalogState.version).filter_by(id=_ROW_ID).scalar() or 0
+
+
+def bump_catalog_version(*artwork_ids):
+    """Increment the version in the current transaction and return the new value.
+
+    `artwork_ids` are the artworks the write touched; without them, other
+    workers rebuild their indexes rather than update them. The caller
+    commits, so the bump becomes visible together with the write.
+    """
+    updated = (
+        db.session.query(CatalogState)
+        .filter_by(id=_ROW_ID)
+        .update(
+            {CatalogState.version: CatalogState.version + 1, CatalogState.updated_at: datetime.utcnow()},
+            synchronize_session=False,
+        )
+    )
+    if not updated:
+        db.session.add(CatalogState(id=_ROW_ID, version=1, updated_at=datetime.utcnow()))
+        db.session.flush()
+    version = current_catalog_version()
+    db.session.add_all([CatalogChange(version=version, artwork_id=i) for i in artwork_ids or [None]])
+    db.session.query(CatalogChange).filter(CatalogChange.version <= version - CHANGE_LOG_VERSIONS).delete(
+        synchronize_session=False
+    )
+    return version
+
+
+def changed_artworks(since, until):
+    """Ids of the artworks written after catalog version `since` up to `until`.
+
+    None when a rebuild is needed instead: no version to start from, a
+    write that did not name its artworks, a log pruned past `since`, or more
+    than MAX_CHANGED_ARTWORKS changes.
+    """
+    if since is None or until is None or since > until:
+        return None
+    rows = (
+        db.session.query(CatalogChange.version, CatalogChange.artwork_id)
+        .filter(CatalogChange.version > since, CatalogChange.version <= until)
+        .all()
+    )
+    changed = {row.artwork_id for row in rows}
+    if len({row.version for row in rows}) != until - since or None in changed or len(changed) > MAX_CHANGED_ARTWORKS:
+        return None
+    return changed
+
+
+def keep_current(index, catalog_version, build, update):
+    """A per-process index brought to `catalog_version` (None: as it is).
+
+    `update(index, changed_ids)` re-reads only the artworks written since the
+    index's version; `build()` makes a new one at start-up or when those are
+    not known (changed_artworks). Both return the index, whose version is set
+    here.
+    """
+    if index is not None and (catalog_version is None or index.version == catalog_version):
+        return index
+    changed = changed_artworks(index.version, catalog_version) if index is not None else None
+    index = update(index, changed) if changed is not None else build()
+    index.version = catalog_version
+    return index
+
+
+def version_after_write(held, written):
+    """Version a per-process index is current at once it has applied, in
+    place, the write that bumped the catalog to `written`.
+
+    That is `written` if the index was current just before the write;
+    otherwise it missed another worker's write and keeps `held`, so it is
+    rebuilt on its next use.
+    """
+    if written is not None and held == written - 1:
+        return written
+    return held
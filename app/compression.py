@@ -0,0 +1,128 @@
+"""
+Precompressed (brotli, gzip) copies of stored GLB files.
+
+Each encoding is produced once, on the first request that accepts it, and
+kept in the derivative cache (app/derivatives.py) under the GLB's content
+hash. A copy that saves less than GLB_MIN_COMPRESSION_SAVING is not sent;
+the identity file is served instead. GLBs whose texture is a PNG or JPEG
+barely compress, since the texture usually dominates the file.
+
+brotli needs the optional ``Brotli`` package; without it only gzip is offered.
+
+Report ratios across the catalog (and warm the cache) with:
+    python -m app.compression [--limit N]
+"""
+
+import os
+import gzip
+import time
+import argparse
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+from .blobs import get_blob_store
+from .derivatives import get_derivative_cache
+from .extensions import db
+from .models import Artwork
+
+ENCODINGS = ("br", "gzip")
+
+
+def available_encodings():
+    return [enc for enc in ENCODINGS if enc != "br" or brotli is not None]
+
+
+def compress(data, encoding, config):
+    if encoding == "gzip":
+        # mtime=0 keeps the output, and so the cached file, deterministic
+        return gzip.compress(data, compresslevel=config.get("GLB_GZIP_LEVEL", 9), mtime=0)
+    if encoding == "br":
+        return brotli.compress(data, quality=config.get("GLB_BROTLI_QUALITY", 9))
+    raise ValueError(f"Unknown encoding: {encoding}")
+
+
+def compressed_key(digest, encoding):
+    return f"{digest}-{encoding}"
+
+
+def get_compressed(digest, source_path, encoding, config):
+    """Cached compressed copy: (path, key, generation_ms or None on a hit)."""
+    cache = get_derivative_cache(config)
+    key = compressed_key(digest, encoding)
+    timing = {}
+
+    def generate():
+        t0 = time.perf_counter()
+        with open(source_path, "rb") as f:
+            data = compress(f.read(), encoding, config)
+        timing["ms"] = (time.perf_counter() - t0) * 1000
+        return data
+
+    path, _ = cache.get_or_create(key, generate)
+    return path, key, timing.get("ms")
+
+
+def worth_sending(compressed_size, original_size, config):
+    return compressed_size <= original_size * (1 - config.get("GLB_MIN_COMPRESSION_SAVING", 0.05))
+
+
+def compression_report(config, limit=None):
+    """Compress every stored GLB with each available encoding.
+
+    Returns {encoding: (original_bytes, compressed_bytes, worth_sending_count)}
+    and the number of GLBs looked at.
+    """
+    store = get_blob_store(config)
+    query = (
+        db.session.query(Artwork.id, Artwork.glb_sha256, Artwork.glb_size)
+        .filter(Artwork.glb_sha256.isnot(None))
+        .order_by(Artwork.id)
+    )
+    if limit:
+        query = query.limit(limit)
+
+    encodings = available_encodings()
+    totals = {enc: [0, 0, 0] for enc in encodings}
+    count = 0
+    for row in query:
+        source = store.path(row.glb_sha256)
+        if not os.path.exists(source):
+            print(f"Artwork {row.id}: GLB missing from blob store")
+            continue
+        count += 1
+        ratios = []
+        for enc in encodings:
+            path, _, _ = get_compressed(row.glb_sha256, source, enc, config)
+            size = os.path.getsize(path)
+            totals[enc][0] += row.glb_size
+            totals[enc][1] += size
+            totals[enc][2] += worth_sending(size, row.glb_size, config)
+            ratios.append(f"{enc} {size / row.glb_size:.3f}")
+        print(f"Artwork {row.id}: {row.glb_size} bytes, " + ", ".join(ratios))
+    return {enc: tuple(t) for enc, t in totals.items()}, count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report GLB compression ratios across the catalog")
+    parser.add_argument("--limit", type=int, help="only the first N artworks")
+    args = parser.parse_args()
+
+    from . import create_app
+
+    app = create_app()
+    with app.app_context():
+        totals, count = compression_report(app.config, limit=args.limit)
+
+    if brotli is None:
+        print("brotli not installed; gzip only")
+    for enc, (original, compressed, worth) in totals.items():
+        ratio = compressed / original if original else 1.0
+        print(f"{enc}: {count} GLBs, {original} -> {compressed} bytes (ratio {ratio:.3f}), "
+              f"{worth} worth sending compressed")
+
+
+if __name__ == "__main__":
+    main()
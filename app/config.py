@@ -7,7 +7,71 @@ class Config:
     SQLALCHEMY_DATABASE_URI = "sqlite:///" + os.path.join(basedir, "artwork.db")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Content-addressed image/GLB files (app/blobs.py)
+    BLOB_STORE_ROOT = os.environ.get("BLOB_STORE_ROOT", os.path.join(basedir, "blobs"))
+    # "direct" (sendfile from the worker), "x-accel" (nginx) or "x-sendfile" (see app/assets.py)
+    BLOB_SERVE_MODE = os.environ.get("BLOB_SERVE_MODE", "direct")
+    BLOB_ACCEL_PREFIX = os.environ.get("BLOB_ACCEL_PREFIX", "/_blobs/")
+    # Read size when streaming blobs not yet moved out of artwork.db; each chunk
+    # reopens the blob, so much smaller chunks cost noticeably more CPU
+    BLOB_CHUNK_SIZE = int(os.environ.get("BLOB_CHUNK_SIZE", 1024 * 1024))
+    # Thumbnails and other derived files (app/derivatives.py), LRU-evicted past the size bound
+    DERIVATIVE_CACHE_ROOT = os.environ.get("DERIVATIVE_CACHE_ROOT", os.path.join(basedir, "derivatives"))
+    DERIVATIVE_CACHE_MAX_BYTES = int(os.environ.get("DERIVATIVE_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+    THUMBNAIL_WIDTHS = [int(w) for w in os.environ.get("THUMBNAIL_WIDTHS", "160,320,640,1280").split(",")]
+    THUMBNAIL_QUALITY = int(os.environ.get("THUMBNAIL_QUALITY", 82))
+    # Formats offered to clients that accept them, in order of preference
+    IMAGE_FORMATS = [f for f in os.environ.get("IMAGE_FORMATS", "avif,webp").split(",") if f]
+    WEBP_QUALITY = int(os.environ.get("WEBP_QUALITY", 80))
+    AVIF_QUALITY = int(os.environ.get("AVIF_QUALITY", 60))
+    # Texture policy for generated GLBs (app/glb.py); format is auto, jpeg or png
+    GLB_TEXTURE_MAX_SIDE = int(os.environ.get("GLB_TEXTURE_MAX_SIDE", 2048))
+    GLB_TEXTURE_FORMAT = os.environ.get("GLB_TEXTURE_FORMAT", "auto")
+    GLB_TEXTURE_QUALITY = int(os.environ.get("GLB_TEXTURE_QUALITY", 85))
+    # "eager" builds the GLB at upload; "lazy" builds it on its first download
+    GLB_GENERATION = os.environ.get("GLB_GENERATION", "eager")
+    # Lighter GLB levels of detail (texture px), built on demand; GLB_MOBILE_LOD is for phones on 3g/4g
+    GLB_LOD_SIDES = [int(s) for s in os.environ.get("GLB_LOD_SIDES", "512,1024,2048").split(",") if s]
+    GLB_MOBILE_LOD = int(os.environ.get("GLB_MOBILE_LOD", 1024))
+    # Frame sizes served by ?width_m= / ?thickness_m= (metres); other values are rejected
+    GLB_MIN_WIDTH_M = float(os.environ.get("GLB_MIN_WIDTH_M", 0.1))
+    GLB_MAX_WIDTH_M = float(os.environ.get("GLB_MAX_WIDTH_M", 3.0))
+    GLB_WIDTH_STEP_M = float(os.environ.get("GLB_WIDTH_STEP_M", 0.05))
+    GLB_THICKNESSES_M = [float(t) for t in os.environ.get("GLB_THICKNESSES_M", "0.005,0.01,0.02,0.03,0.05").split(",") if t]
+    # Content-Encodings offered for GLB downloads, in order of preference (br needs Brotli)
+    GLB_ENCODINGS = [e for e in os.environ.get("GLB_ENCODINGS", "br,gzip").split(",") if e]
+    GLB_GZIP_LEVEL = int(os.environ.get("GLB_GZIP_LEVEL", 9))
+    GLB_BROTLI_QUALITY = int(os.environ.get("GLB_BROTLI_QUALITY", 9))
+    GLB_MIN_COMPRESSION_SAVING = float(os.environ.get("GLB_MIN_COMPRESSION_SAVING", 0.05))
+    # Uploads return 202 and a process pool builds the GLB (app/jobs.py). The pool runs inside
+    # the web tier unless GLB_JOB_RUNNER_IN_APP is off and `python -m app.jobs` runs the queue;
+    # 0 workers = one per core
+    GLB_JOBS_ENABLED = os.environ.get("GLB_JOBS_ENABLED", "true").lower() in ("1", "true", "yes")
+    GLB_JOB_RUNNER_IN_APP = os.environ.get("GLB_JOB_RUNNER_IN_APP", "true").lower() in ("1", "true", "yes")
+    GLB_JOB_WORKERS = int(os.environ.get("GLB_JOB_WORKERS", 1))
+    GLB_JOB_MAX_ATTEMPTS = int(os.environ.get("GLB_JOB_MAX_ATTEMPTS", 3))
+    GLB_JOB_POLL_INTERVAL = float(os.environ.get("GLB_JOB_POLL_INTERVAL", 2))
+
     RAZORPAY_KEY_ID = os.environ.get("RAZORPAY_KEY_ID")
     RAZORPAY_KEY_SECRET = os.environ.get("RAZORPAY_KEY_SECRET")
+    # Text similarity used by recommendations: "jaccard" or "tfidf"
+    RECOMMENDATION_TEXT_SCORING = os.environ.get("RECOMMENDATION_TEXT_SCORING", "jaccard")
+    # "exact" scans every histogram; "approximate" uses the LSH index (app/ann_index.py);
+    # "streaming" scans the database in chunks without keeping an engine in memory
+    # (the similarity refresher then scans the same way, see app/similar_artworks.py)
+    RECOMMENDATION_MODE = os.environ.get("RECOMMENDATION_MODE", "exact")
+    RECOMMENDATION_CHUNK_SIZE = int(os.environ.get("RECOMMENDATION_CHUNK_SIZE", 1000))
+    ANN_INDEX_PATH = os.environ.get("ANN_INDEX_PATH", os.path.join(basedir, "ann_index.npz"))
+    ANN_TABLES = int(os.environ.get("ANN_TABLES", 8))
+    ANN_BITS = int(os.environ.get("ANN_BITS", 12))
+    ANN_CANDIDATES = int(os.environ.get("ANN_CANDIDATES", 500))
+    # Per-worker LRU of top-N results, invalidated by the shared catalog version
+    RECOMMENDATION_CACHE_SIZE = int(os.environ.get("RECOMMENDATION_CACHE_SIZE", 1024))
+    # "materialized" answers from the artwork_similarity table, "live" always computes
+    RECOMMENDATION_SOURCE = os.environ.get("RECOMMENDATION_SOURCE", "materialized")
+    SIMILARITY_TOP_K = int(os.environ.get("SIMILARITY_TOP_K", 12))
+    SIMILARITY_REFRESH_ENABLED = os.environ.get("SIMILARITY_REFRESH_ENABLED", "true").lower() in ("1", "true", "yes")
+    SIMILARITY_REFRESH_INTERVAL = float(os.environ.get("SIMILARITY_REFRESH_INTERVAL", 5))
+
     # Keep for SPA paths
     BASEDIR = basedir
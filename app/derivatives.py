@@ -0,0 +1,142 @@
+"""
+Size-bounded on-disk cache for files derived from stored blobs (thumbnails,
+re-encoded images, ...).
+
+Keys always include the source blob's content hash, so an entry never goes
+stale; it only ages out. Eviction is least-recently-used by mtime (hits
+touch the file) once the cache grows past DERIVATIVE_CACHE_MAX_BYTES.
+Misses are single-flight: a striped file lock (app/locks.py) makes
+concurrent requests for the same key, in any thread or worker, wait for one
+generator instead of all doing the work.
+"""
+
+import os
+import zlib
+import tempfile
+import threading
+from flask import current_app
+
+from .locks import file_lock
+
+LOCK_STRIPES = 64
+EVICT_TO = 0.9  # fraction of max_bytes left after an eviction pass
+
+
+class DerivativeCache:
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._size = None  # bytes on disk, estimated between scans
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def path(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def _lock_path(self, key):
+        stripe = zlib.crc32(key.encode()) % LOCK_STRIPES
+        return os.path.join(self.root, ".locks", f"{stripe:02d}.lock")
+
+    def _touch(self, key):
+        path = self.path(key)
+        try:
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:
+            return None
+        return path
+
+    def get(self, key):
+        """Path of the cached entry, or None."""
+        path = self._touch(key)
+        if path is not None:
+            self.hits += 1
+        return path
+
+    def get_or_create(self, key, generate):
+        """(path, created): the cached file for `key`, calling `generate()`
+        (which returns bytes) only if no worker has produced it yet."""
+        path = self.get(key)
+        if path is not None:
+            return path, False
+        with file_lock(self._lock_path(key)):
+            path = self._touch(key)
+            if path is not None:
+                self.hits += 1
+                return path, False
+            data = generate()
+            path = self._write(key, data)
+        self.misses += 1
+        self._account(len(data))
+        return path, True
+
+    def _write(self, key, data):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return path
+
+    def _entries(self):
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [d for d in dirnames if d != ".locks"]
+            for name in filenames:
+                if name.startswith(".tmp-"):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield st.st_mtime, st.st_size, path
+
+    def _account(self, added):
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._entries())
+            else:
+                self._size += added
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Rescan: other workers write to the same directory.
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * EVICT_TO
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            self.evictions += 1
+        self._size = total
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size_bytes": self._size,
+            "max_bytes": self.max_bytes,
+        }
+
+
+_caches = {}
+
+
+def get_derivative_cache(config=None):
+    config = config or current_app.config
+    root = config["DERIVATIVE_CACHE_ROOT"]
+    if root not in _caches:
+        _caches[root] = DerivativeCache(root, config.get("DERIVATIVE_CACHE_MAX_BYTES", 512 << 20))
+    return _caches[root]
@@ -0,0 +1,146 @@
+"""
+Persisted image features for the recommender.
+
+Features are computed once when an artwork is ingested and stored in the
+``artwork_feature`` table, so recommendation requests only read a few KB per
+artwork instead of decoding every image blob.
+
+Backfill existing rows with:
+    python -m app.features [--force] [--batch-size N]
+"""
+
+import io
+import argparse
+import numpy as np
+from datetime import datetime
+from PIL import Image
+from flask import current_app
+
+from .blobs import read_image
+from .catalog import bump_catalog_version
+from .extensions import db
+from .imaging import draft_decode, upload_decode_side
+from .models import Artwork, ArtworkFeature
+
+# Bump whenever the way features are computed changes; stale rows are
+# ignored by the recommender and picked up again by the backfill.
+FEATURE_VERSION = "rgbhist64-v3"
+HISTOGRAM_SIZE = (64, 64)
+HISTOGRAM_BINS = 768
+
+
+def analysis_sample(img):
+    """The 64x64 RGB sample histograms and palettes are computed from, out of
+    an image decoded at imaging.upload_decode_side.
+
+    ingest_image passes the image it has already decoded; sample_from_bytes
+    decodes the same way, so ingest, the backfills and similar-image search
+    get identical features for identical images (under the same config).
+    """
+    return img.convert("RGB").resize(HISTOGRAM_SIZE)
+
+
+def sample_from_bytes(image_data, config=None):
+    config = config or current_app.config
+    with Image.open(io.BytesIO(image_data)) as img:
+        return analysis_sample(draft_decode(img, upload_decode_side(img, config)))
+
+
+def histogram_from_image(img):
+    """RGB histogram (768 bins) of an already decoded PIL image."""
+    return img.convert("RGB").resize(HISTOGRAM_SIZE).histogram()
+
+
+def histogram_from_bytes(image_data):
+    try:
+        return histogram_from_image(sample_from_bytes(image_data))
+    except Exception:
+        return None
+
+
+def pack_histogram(hist):
+    return np.asarray(hist, dtype=np.float32).tobytes()
+
+
+def unpack_histogram(blob):
+    return np.frombuffer(blob, dtype=np.float32)
+
+
+def store_features(artwork, image_data=None, hist=None):
+    """Compute (unless given) and attach the feature record to `artwork`.
+
+    The caller owns the session commit. Returns False when the image could not
+    be decoded, in which case the artwork simply has no features.
+    """
+    if hist is None:
+        hist = histogram_from_bytes(image_data)
+    if hist is None:
+        return False
+
+    feature = artwork.features
+    if feature is None:
+        feature = ArtworkFeature()
+        artwork.features = feature
+    feature.version = FEATURE_VERSION
+    feature.histogram = pack_histogram(hist)
+    feature.computed_at = datetime.utcnow()
+    return True
+
+
+def load_histogram(feature):
+    """Histogram (as a list) from a feature row, or None if missing or from an older version."""
+    if feature is None or feature.version != FEATURE_VERSION:
+        return None
+    return unpack_histogram(feature.histogram).tolist()
+
+
+def backfill_features(batch_size=50, force=False):
+    """Compute features for artworks that have none (or a stale version).
+
+    Works in batches of ids so only `batch_size` image blobs are held in memory
+    at a time. Returns (processed, failed).
+    """
+    from .similar_artworks import queue_similarity_refresh
+
+    query = db.session.query(Artwork.id).outerjoin(ArtworkFeature)
+    if not force:
+        query = query.filter(
+            (ArtworkFeature.artwork_id.is_(None)) | (ArtworkFeature.version != FEATURE_VERSION)
+        )
+    ids = [row.id for row in query.order_by(Artwork.id).all()]
+
+    processed = failed = 0
+    for start in range(0, len(ids), batch_size):
+        batch = Artwork.query.filter(Artwork.id.in_(ids[start:start + batch_size])).all()
+        for artwork in batch:
+            if store_features(artwork, read_image(artwork)):
+                queue_similarity_refresh(artwork.id)
+                processed += 1
+            else:
+                failed += 1
+                print(f"Could not compute features for artwork {artwork.id}")
+        bump_catalog_version(*(artwork.id for artwork in batch))
+        db.session.commit()
+        db.session.expunge_all()
+        print(f"Backfilled {processed + failed}/{len(ids)} artworks")
+
+    return processed, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill persisted artwork image features")
+    parser.add_argument("--force", action="store_true", help="recompute features for every artwork")
+    parser.add_argument("--batch-size", type=int, default=50)
+    args = parser.parse_args()
+
+    from . import create_app
+
+    app = create_app()
+    with app.app_context():
+        processed, failed = backfill_features(batch_size=args.batch_size, force=args.force)
+
+    print(f"Done: {processed} artworks updated, {failed} failed")
+
+
+if __name__ == "__main__":
+    main()
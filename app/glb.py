@@ -0,0 +1,445 @@
+"""
+GLB models of artworks: a thin textured box the size of the painting.
+
+The texture follows a configurable policy (GLB_TEXTURE_MAX_SIDE,
+GLB_TEXTURE_FORMAT, GLB_TEXTURE_QUALITY): the image is scaled down so its
+longest side fits, then embedded as JPEG, or as PNG when it has an alpha
+channel (``auto``). Mobile AR viewers reject or downsample textures much
+beyond 2048-4096px, so larger ones only cost bytes.
+
+The file is written directly (write_box_glb): 24 vertices, so each face has
+its own normal, with UVs projecting the image onto the front and back the
+way the earlier trimesh export did, and the encoded texture passed through
+untouched.
+
+With GLB_GENERATION=lazy, uploads store only the image and the first
+download builds the GLB (build_missing_glb), once across workers.
+
+Lighter levels of detail (GLB_LOD_SIDES, e.g. 512/1024px textures) are built
+from the original image on first request and kept in the derivative cache;
+lod_for_client picks one from the X-Mobile-Request / X-Connection-Type hints.
+Other frame sizes (a width from a quantised range, a thickness from a short
+list, or the width parsed from the artwork's ``dimensions``) are built and
+cached the same way.
+
+Report per-artwork GLB size and generation time, or rebuild GLBs made under
+another policy, with:
+    python -m app.glb report
+    python -m app.glb regenerate [--all] [--batch-size N]
+"""
+
+import io
+import os
+import re
+import json
+import time
+import struct
+import argparse
+import numpy as np
+from PIL import Image, ImageEnhance
+from flask import current_app
+
+from .blobs import read_image, store_glb
+from .derivatives import get_derivative_cache
+from .extensions import db
+from .imaging import draft_decode, has_alpha
+from .locks import file_lock
+from .models import Artwork
+
+TEXTURE_FORMATS = ("auto", "jpeg", "png")
+# frame size of the stored GLB; other sizes are variants (get_lod_glb)
+DEFAULT_WIDTH_M = 0.6
+DEFAULT_THICKNESS_M = 0.01
+
+_UNIT_M = {"mm": 0.001, "cm": 0.01, "m": 1.0, "in": 0.0254, "inch": 0.0254, "inches": 0.0254, '"': 0.0254,
+           "ft": 0.3048, "foot": 0.3048, "feet": 0.3048}
+_NUMBER = r"(\d+(?:\.\d+)?)"
+_UNIT = r"""(?:(mm|cm|m|inches|inch|in|"|feet|foot|ft)(?![a-z]))"""
+_BY = r"\s*(?:x|×|by)\s*"
+# "24x36 inches", "60 x 90 cm", '24" x 36"', "24 x 36 x 1.5 in"
+_DIMENSIONS = re.compile(
+    _NUMBER + r"\s*" + _UNIT + "?" + _BY + _NUMBER + r"(?:" + _BY + r"\d+(?:\.\d+)?)?\s*" + _UNIT + "?",
+    re.IGNORECASE,
+)
+
+
+def texture_policy(config=None):
+    config = config or current_app.config
+    policy = {
+        "max_side": int(config.get("GLB_TEXTURE_MAX_SIDE", 2048)),
+        "format": config.get("GLB_TEXTURE_FORMAT", "auto"),
+        "quality": int(config.get("GLB_TEXTURE_QUALITY", 85)),
+    }
+    if policy["format"] not in TEXTURE_FORMATS:
+        raise ValueError(f"Unknown GLB_TEXTURE_FORMAT: {policy['format']}")
+    return policy
+
+
+def policy_tag(policy):
+    """Short description stored with each GLB, e.g. "2048-auto-q85"."""
+    return f"{policy['max_side']}-{policy['format']}-q{policy['quality']}"
+
+
+def prepare_texture(img, policy):
+    """(encoded bytes, mimetype, (width, height), has_alpha) of the texture."""
+    alpha = has_alpha(img)
+    max_side = policy["max_side"]
+    img = draft_decode(img, max_side).convert("RGBA" if alpha else "RGB")
+    if max(img.size) > max_side:
+        img.thumbnail((max_side, max_side), Image.LANCZOS, reducing_gap=3.0)
+
+    texture = img.convert("RGB")
+    texture = ImageEnhance.Contrast(texture).enhance(1.2)
+    texture = ImageEnhance.Color(texture).enhance(1.1)
+
+    fmt = policy["format"]
+    if fmt == "auto":
+        fmt = "png" if alpha else "jpeg"
+    out = io.BytesIO()
+    if fmt == "png":
+        if alpha:
+            texture.putalpha(img.getchannel("A"))
+        texture.save(out, "PNG")
+        return out.getvalue(), "image/png", texture.size, alpha
+    texture.save(out, "JPEG", quality=policy["quality"], optimize=True)
+    return out.getvalue(), "image/jpeg", texture.size, False
+
+
+def _unit_box():
+    """Positions, normals and triangle indices of a unit cube centred on the
+    origin, four vertices per face, counter-clockwise seen from outside."""
+    positions, normals, indices = [], [], []
+    for axis in range(3):
+        for sign in (1.0, -1.0):
+            n = np.zeros(3)
+            n[axis] = sign
+            u = np.zeros(3)
+            u[(axis + 1) % 3] = 1.0
+            v = np.cross(n, u)  # u x v == n
+            base = len(positions)
+            for su, sv in ((-1, -1), (1, -1), (1, 1), (-1, 1)):
+                positions.append(0.5 * (n + su * u + sv * v))
+                normals.append(n)
+            indices += [base, base + 1, base + 2, base, base + 2, base + 3]
+    return (
+        np.array(positions, dtype=np.float32),
+        np.array(normals, dtype=np.float32),
+        np.array(indices, dtype=np.uint16),
+    )
+
+
+_BOX_POSITIONS, _BOX_NORMALS, _BOX_INDICES = _unit_box()
+
+# What trimesh wrote for its default material; kept so models look the same
+_MATERIAL = {
+    "pbrMetallicRoughness": {
+        "baseColorTexture": {"index": 0},
+        "baseColorFactor": [0.4, 0.4, 0.4, 1.0],
+        "roughnessFactor": 0.9036020036098448,
+    },
+    "doubleSided": False,
+}
+
+ARRAY_BUFFER, ELEMENT_ARRAY_BUFFER = 34962, 34963
+FLOAT, UNSIGNED_SHORT = 5126, 5123
+
+
+def _pack_glb(tree, binary):
+    json_chunk = json.dumps(tree, separators=(",", ":")).encode()
+    json_chunk += b" " * (-len(json_chunk) % 4)
+    binary += b"\0" * (-len(binary) % 4)
+    length = 12 + 8 + len(json_chunk) + 8 + len(binary)
+    return b"".join([
+        struct.pack("<4sII", b"glTF", 2, length),
+        struct.pack("<I4s", len(json_chunk), b"JSON"), json_chunk,
+        struct.pack("<I4s", len(binary), b"BIN\0"), binary,
+    ])
+
+
+def write_box_glb(width, height, thickness, texture, mimetype, has_alpha=False):
+    """GLB of a width x height x thickness box (metres) standing on z=0, the
+    image/jpeg or image/png `texture` bytes covering its front and back."""
+    positions = _BOX_POSITIONS * np.array([width, height, thickness], dtype=np.float32)
+    positions[:, 2] += thickness / 2.0
+    # u runs left to right, v top to bottom (glTF's origin is the image's top left)
+    uv = np.stack([_BOX_POSITIONS[:, 0] + 0.5, 0.5 - _BOX_POSITIONS[:, 1]], axis=1).astype(np.float32)
+
+    views, chunks, offset = [], [], 0
+    for data, target in (
+        (_BOX_INDICES.tobytes(), ELEMENT_ARRAY_BUFFER),
+        (positions.tobytes(), ARRAY_BUFFER),
+        (_BOX_NORMALS.tobytes(), ARRAY_BUFFER),
+        (uv.tobytes(), ARRAY_BUFFER),
+        (texture, None),
+    ):
+        view = {"buffer": 0, "byteOffset": offset, "byteLength": len(data)}
+        if target:
+            view["target"] = target
+        views.append(view)
+        data += b"\0" * (-len(data) % 4)  # keep every view 4-byte aligned
+        chunks.append(data)
+        offset += len(data)
+
+    material = dict(_MATERIAL, alphaMode="BLEND") if has_alpha else _MATERIAL
+    tree = {
+        "asset": {"version": "2.0", "generator": "artwork-gallery"},
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": [{"name": "world", "children": [1]}, {"name": "artwork", "mesh": 0}],
+        "meshes": [{
+            "name": "artwork",
+            "primitives": [{
+                "attributes": {"POSITION": 1, "NORMAL": 2, "TEXCOORD_0": 3},
+                "indices": 0,
+                "mode": 4,
+                "material": 0,
+            }],
+        }],
+        "accessors": [
+            {"bufferView": 0, "componentType": UNSIGNED_SHORT, "count": len(_BOX_INDICES), "type": "SCALAR"},
+            {
+                "bufferView": 1, "componentType": FLOAT, "count": len(positions), "type": "VEC3",
+                "min": positions.min(axis=0).tolist(), "max": positions.max(axis=0).tolist(),
+            },
+            {"bufferView": 2, "componentType": FLOAT, "count": len(positions), "type": "VEC3"},
+            {"bufferView": 3, "componentType": FLOAT, "count": len(positions), "type": "VEC2"},
+        ],
+        "materials": [material],
+        "textures": [{"source": 0}],
+        "images": [{"bufferView": 4, "mimeType": mimetype}],
+        "buffers": [{"byteLength": offset}],
+        "bufferViews": views,
+    }
+    return _pack_glb(tree, b"".join(chunks))
+
+
+def create_glb_from_image(source, width_m=DEFAULT_WIDTH_M, thickness_m=DEFAULT_THICKNESS_M, policy=None):
+    """GLB bytes for an image file (path or file object) or an already
+    decoded PIL image; None if it cannot be built."""
+    try:
+        img = source if isinstance(source, Image.Image) else Image.open(source)
+        w_px, h_px = img.size
+        if w_px == 0 or h_px == 0:
+            raise ValueError("Invalid image dimensions")
+
+        texture, mimetype, (w_px, h_px), has_alpha = prepare_texture(img, policy or texture_policy())
+        aspect = h_px / float(w_px)
+
+        W = float(width_m)
+        H = W * aspect
+        T = float(thickness_m)
+        return write_box_glb(W, H, T, texture, mimetype, has_alpha)
+
+    except Exception as e:
+        print(f"Error in create_glb_from_image: {str(e)}")
+        return None
+
+
+def generate_glb(artwork, image, policy=None):
+    """Build the artwork's GLB from `image` (bytes or a decoded PIL image) under
+    the texture policy and store it, recording the policy and generation
+    time. The caller commits; False on failure."""
+    policy = policy or texture_policy()
+    t0 = time.perf_counter()
+    source = image if isinstance(image, Image.Image) else io.BytesIO(image)
+    glb_bytes = create_glb_from_image(source, policy=policy)
+    if not glb_bytes:
+        return False
+    elapsed_ms = (time.perf_counter() - t0) * 1000
+
+    store_glb(artwork, glb_bytes)
+    artwork.glb_texture_policy = policy_tag(policy)
+    artwork.glb_generation_ms = elapsed_ms
+    print(f"GLB for {artwork.name!r}: {len(glb_bytes)} bytes ({artwork.glb_texture_policy}) in {elapsed_ms:.0f} ms")
+    return True
+
+
+def _build_lock_path(artwork_id):
+    # striped, so the lock files stay few however many artworks there are
+    return os.path.join(current_app.instance_path, "glb-build", f"{artwork_id % 64}.lock")
+
+
+def build_missing_glb(artwork_id):
+    """Build and store the GLB of an artwork that has none yet (GLB_GENERATION
+    "lazy", or its upload job still queued).
+
+    Single-flight across workers: concurrent first downloads wait on one file
+    lock, the first builds and commits, and the rest find the GLB stored once
+    they get the lock. Returns (glb digest or None on failure, generation_ms
+    or None when another request built it).
+    """
+    # end the request's read transaction so the row is re-read after the wait
+    db.session.rollback()
+    with file_lock(_build_lock_path(artwork_id)):
+        artwork = db.session.get(Artwork, artwork_id, populate_existing=True)
+        if artwork is None:
+            return None, None
+        if artwork.glb_sha256 or not artwork.image_sha256:
+            return artwork.glb_sha256, None
+        image = read_image(artwork)
+        if not image or not generate_glb(artwork, image):
+            db.session.rollback()
+            return None, None
+        digest, elapsed_ms = artwork.glb_sha256, artwork.glb_generation_ms
+        db.session.commit()
+    return digest, elapsed_ms
+
+
+def lod_for_client(mobile, connection_type, config):
+    """Texture side for a client's hints, or None for the full GLB.
+
+    connection_type is the Network Information API effectiveType
+    (slow-2g, 2g, 3g, 4g) when the client sends it.
+    """
+    sides = sorted(config.get("GLB_LOD_SIDES", []))
+    if not sides:
+        return None
+    connection_type = (connection_type or "").lower()
+    if connection_type in ("slow-2g", "2g"):
+        return sides[0]
+    if connection_type == "3g" or mobile:
+        return config.get("GLB_MOBILE_LOD", sides[len(sides) // 2])
+    return None
+
+
+def parse_dimensions(text, landscape=None):
+    """Painting width in metres from a free-text size such as "24x36 inches"
+    or "60 x 90 cm", or None if it has no recognisable size and unit.
+
+    Listings put either side first, so with `landscape` known the width is
+    the longer side for landscape images and the shorter one otherwise.
+    """
+    match = _DIMENSIONS.search(text or "")
+    if not match:
+        return None
+    unit = (match.group(4) or match.group(2) or "").lower()
+    if unit not in _UNIT_M:
+        return None
+    first, second = float(match.group(1)), float(match.group(3))
+    if landscape is None:
+        width = first
+    else:
+        width = max(first, second) if landscape else min(first, second)
+    return width * _UNIT_M[unit]
+
+
+def width_steps(config):
+    """(min, max, step) of the frame widths GLB variants are built at, in metres."""
+    return (
+        config.get("GLB_MIN_WIDTH_M", 0.1),
+        config.get("GLB_MAX_WIDTH_M", 3.0),
+        config.get("GLB_WIDTH_STEP_M", 0.05),
+    )
+
+
+def quantize_width(width_m, config):
+    """Nearest allowed width, within the allowed range."""
+    low, high, step = width_steps(config)
+    return round(min(max(round(width_m / step) * step, low), high), 4)
+
+
+def allowed_width(width_m, config):
+    low, high, step = width_steps(config)
+    return low - 1e-9 <= width_m <= high + 1e-9 and abs(width_m - quantize_width(width_m, config)) < 1e-6
+
+
+def allowed_thickness(thickness_m, config):
+    return any(abs(thickness_m - t) < 1e-6 for t in config.get("GLB_THICKNESSES_M", [DEFAULT_THICKNESS_M]))
+
+
+def lod_key(image_digest, side, policy, width_m=DEFAULT_WIDTH_M, thickness_m=DEFAULT_THICKNESS_M):
+    key = f"{image_digest}-glb{side}-{policy['format']}-q{policy['quality']}"
+    if (width_m, thickness_m) != (DEFAULT_WIDTH_M, DEFAULT_THICKNESS_M):
+        key += f"-{round(width_m * 1000)}x{round(thickness_m * 1000)}mm"
+    return key
+
+
+def get_lod_glb(image_digest, image_path, side, config, width_m=DEFAULT_WIDTH_M, thickness_m=DEFAULT_THICKNESS_M):
+    """Cached GLB with the texture capped at `side` and the frame `width_m`
+    wide and `thickness_m` deep: (path, key, generation_ms or None on a hit)."""
+    policy = dict(texture_policy(config), max_side=side)
+    key = lod_key(image_digest, side, policy, width_m, thickness_m)
+    timing = {}
+
+    def generate():
+        t0 = time.perf_counter()
+        with open(image_path, "rb") as f:
+            data = create_glb_from_image(f, width_m, thickness_m, policy=policy)
+        if data is None:
+            raise ValueError(f"Could not build the {side}px GLB for image {image_digest[:12]}")
+        timing["ms"] = (time.perf_counter() - t0) * 1000
+        return data
+
+    path, _ = get_derivative_cache(config).get_or_create(key, generate)
+    return path, key, timing.get("ms")
+
+
+def glb_report():
+    """[(id, name, glb_size, policy, generation_ms), ...] for every artwork with a GLB."""
+    rows = (
+        db.session.query(
+            Artwork.id, Artwork.name, Artwork.glb_size,
+            Artwork.glb_texture_policy, Artwork.glb_generation_ms,
+        )
+        .filter(Artwork.glb_sha256.isnot(None))
+        .order_by(Artwork.id)
+    )
+    return [tuple(row) for row in rows]
+
+
+def regenerate_glbs(policy, batch_size=20, regenerate_all=False):
+    """Rebuild GLBs not made under `policy` (all of them with regenerate_all).
+    Returns (processed, failed)."""
+    query = db.session.query(Artwork.id)
+    if not regenerate_all:
+        tag = policy_tag(policy)
+        query = query.filter((Artwork.glb_texture_policy != tag) | Artwork.glb_texture_policy.is_(None))
+    ids = [row.id for row in query.order_by(Artwork.id).all()]
+
+    processed = failed = 0
+    for start in range(0, len(ids), batch_size):
+        batch = Artwork.query.filter(Artwork.id.in_(ids[start:start + batch_size])).all()
+        for artwork in batch:
+            if generate_glb(artwork, read_image(artwork), policy):
+                processed += 1
+            else:
+                failed += 1
+                print(f"Could not regenerate the GLB for artwork {artwork.id}")
+        db.session.commit()
+        db.session.expunge_all()
+        print(f"Regenerated {processed + failed}/{len(ids)} GLBs")
+
+    return processed, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GLB texture policy maintenance")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("report", help="per-artwork GLB size, texture policy and generation time")
+    regenerate = sub.add_parser("regenerate", help="rebuild GLBs made under another texture policy")
+    regenerate.add_argument("--all", action="store_true", help="rebuild every GLB")
+    regenerate.add_argument("--batch-size", type=int, default=20)
+    args = parser.parse_args()
+
+    from . import create_app
+
+    app = create_app()
+    with app.app_context():
+        if args.command == "report":
+            rows = glb_report()
+            for artwork_id, name, size, tag, ms in rows:
+                timing = f"{ms:.0f} ms" if ms is not None else "-"
+                print(f"{artwork_id:>6} {size or 0:>10} bytes  {tag or 'legacy':<16} {timing:>9}  {name}")
+            total = sum(row[2] or 0 for row in rows)
+            print(f"{len(rows)} GLBs, {total} bytes, current policy {policy_tag(texture_policy())}")
+        else:
+            processed, failed = regenerate_glbs(
+                texture_policy(), batch_size=args.batch_size, regenerate_all=args.all
+            )
+            print(f"Done: {processed} GLBs regenerated, {failed} failed")
+            if processed:
+                print("Old GLB files remain in the blob store until `python -m app.blobs gc`")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Decoding helpers shared by the code that derives smaller images from an
+original (GLB textures, thumbnails, histograms and palettes).
+"""
+
+import math
+
+# smallest side an upload is decoded at: plenty for the 64x64 analysis sample
+MIN_DECODE_SIDE = 256
+
+
+def draft_decode(img, side):
+    """Decode a freshly opened image at no less than `side` px on its longest side.
+
+    A JPEG decodes straight at 1/2, 1/4 or 1/8 scale, far cheaper than in
+    full; other formats decode in full.
+    """
+    scale = side / max(img.size)
+    if scale < 1:
+        img.draft("RGB", (math.ceil(img.width * scale), math.ceil(img.height * scale)))
+    img.load()
+    return img
+
+
+def has_alpha(img):
+    return img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+
+
+def upright_width(img, size=None):
+    """Width of the image once EXIF orientation is applied; `size` overrides
+    img.size (e.g. the header size of a draft-decoded JPEG)."""
+    width, height = size or img.size
+    orientation = img.getexif().get(0x0112, 1)
+    return height if orientation in (5, 6, 7, 8) else width
+
+
+def side_for_width(img, width):
+    """Longest side to decode `img` at for it to be `width` wide once upright."""
+    return math.ceil(width * max(img.size) / upright_width(img))
+
+
+def upload_decode_side(img, config):
+    """Longest side ingest_image decodes an upload at, from its header.
+
+    Enough for the GLB texture (unless GLB_GENERATION is lazy) and the
+    widest thumbnail narrower than the image. It depends only on the header
+    and config, so features.sample_from_bytes decodes the same pixels.
+    """
+    from .glb import texture_policy  # glb imports this module
+
+    sides = [MIN_DECODE_SIDE]
+    if config.get("GLB_GENERATION") != "lazy":
+        sides.append(texture_policy(config)["max_side"])
+    original = upright_width(img)
+    sides += [side_for_width(img, w) for w in config.get("THUMBNAIL_WIDTHS", []) if w < original]
+    return max(sides)
@@ -0,0 +1,119 @@
+"""
+Ingest of an uploaded artwork image: one decode, every derivative.
+
+ingest_image decodes the upload once, at the smallest JPEG draft scale that
+still covers the largest thing built from it (the GLB texture or the widest
+thumbnail; imaging.upload_decode_side), and from that one in-memory image
+produces:
+
+* metadata - pixel dimensions and mime type from the decoded header
+* the stored original and its content hash (blob store)
+* the GLB, under the texture policy (app/glb.py), unless GLB_GENERATION is
+  "lazy", in which case the first download builds it, or one is stored already
+* similarity features and the dominant-colour palette, from one shared
+  64x64 sample (features.analysis_sample); the backfills and similar-image
+  search decode at the same side, so they compute the same features
+* thumbnails at THUMBNAIL_WIDTHS, written into the derivative cache
+
+Each stage is timed; the timings are logged and returned to the caller.
+Uploads through /make-glb run this in a background job (app/jobs.py).
+"""
+
+import io
+import time
+from PIL import Image, ImageOps
+from flask import current_app
+
+from .blobs import store_image
+from .derivatives import get_derivative_cache
+from .features import analysis_sample, histogram_from_image, store_features
+from .glb import generate_glb, texture_policy
+from .imaging import draft_decode, has_alpha, upload_decode_side, upright_width
+from .palette import palette_from_image, store_palette
+from .thumbnails import encode_variant, variant_key, variant_quality
+
+
+class _Timer:
+    def __init__(self):
+        self.timings = {}
+        self._start = self._last = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.timings[stage] = round((now - self._last) * 1000, 1)
+        self._last = now
+
+    def done(self):
+        self.timings["total"] = round((time.perf_counter() - self._start) * 1000, 1)
+        return self.timings
+
+
+def _store_thumbnails(img, digest, original_width, config):
+    """Fill the derivative cache with the allowed widths the image is wider
+    than. Each width is resized from the previous, larger one rather than
+    from the full image."""
+    cache = get_derivative_cache(config)
+    quality = variant_quality(None, config)
+    source = ImageOps.exif_transpose(img)
+    # resample in RGB(A): palette and 1-bit images resize badly in their own mode
+    source = source.convert("RGBA" if has_alpha(source) else "RGB")
+    aspect = source.height / source.width
+    for width in sorted(config.get("THUMBNAIL_WIDTHS", []), reverse=True):
+        if width >= original_width:
+            continue
+        source = source.resize((width, max(1, round(width * aspect))), Image.LANCZOS, reducing_gap=3.0)
+        cache.get_or_create(
+            variant_key(digest, width, None, config),
+            lambda source=source: encode_variant(source, None, None, quality)[0],
+        )
+
+
+def ingest_image(artwork, image_data, mime=None, config=None, store=True):
+    """Fill `artwork` from an uploaded image; the caller adds and commits.
+
+    With `store` False the image is taken to be in the blob store already
+    (a queued upload, app/jobs.py) and is not put there again.
+
+    Returns {stage: ms}, or None when the image cannot be decoded or the GLB
+    cannot be built.
+    """
+    config = config or current_app.config
+    timer = _Timer()
+
+    try:
+        img = Image.open(io.BytesIO(image_data))
+        size = img.size
+        original_width = upright_width(img)
+        draft_decode(img, upload_decode_side(img, config))
+    except Exception as e:
+        print(f"Could not decode upload: {e}")
+        return None
+    artwork.image_width, artwork.image_height = size
+    mime = Image.MIME.get(img.format) or mime
+    policy = texture_policy(config)
+    # a lazily built GLB may already be stored by the time a queued upload runs
+    build_glb = config.get("GLB_GENERATION") != "lazy" and not artwork.glb_sha256
+    timer.lap("decode")
+
+    if store:
+        store_image(artwork, image_data, mime)
+        timer.lap("store_image")
+
+    if build_glb:
+        if not generate_glb(artwork, img, policy):
+            return None
+        timer.lap("glb")
+
+    # histogram and palette are both computed from the same 64x64 sample
+    sample = analysis_sample(img)
+    store_features(artwork, hist=histogram_from_image(sample))
+    store_palette(artwork, palette=palette_from_image(sample))
+    timer.lap("features")
+
+    _store_thumbnails(img, artwork.image_sha256, original_width, config)
+    timer.lap("thumbnails")
+
+    timings = timer.done()
+    print(f"Ingested {artwork.name!r} ({size[0]}x{size[1]} {mime}): "
+          + ", ".join(f"{stage} {ms} ms" for stage, ms in timings.items()))
+    return timings
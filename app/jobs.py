@@ -0,0 +1,316 @@
+"""
+Background GLB generation for uploads.
+
+/make-glb stores the original image, creates the artwork and a ``glb_job``
+row, and answers 202 with the job id; ``GET /api/jobs/<id>`` reports the
+job as queued, running, done or failed, with the ingest timings. The queue
+is the table itself, in the app database, so queued jobs survive restarts
+and no broker is needed.
+
+One runner per host: a thread in each worker tries a file lock, and the
+worker that holds it claims queued jobs and hands them to a process pool
+(GLB_JOB_WORKERS processes, default 1; 0 for one per core) that runs the rest of the ingest
+(app/ingest.py: GLB, features, palette, thumbnails). If that worker dies,
+another one takes the lock over; jobs it left running go back on the queue
+until they have been tried GLB_JOB_MAX_ATTEMPTS times. A job that ends
+failed takes its artwork with it (deleted, like DELETE /artworks/<id>); the
+job row stays, with the error, for GET /api/jobs/<id>.
+
+With GLB_JOB_RUNNER_IN_APP=false the web workers only queue jobs, and the
+queue is run on its own (on a host that shares the database and stores):
+    python -m app.jobs [--workers N] [--once]
+"""
+
+import os
+import json
+import time
+import argparse
+import threading
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from .blobs import read_image
+from .catalog import bump_catalog_version
+from .config import Config
+from .extensions import db
+from .ingest import ingest_image
+from .locks import file_lock
+from .models import Artwork, GlbJob
+from .similar_artworks import queue_similarity_refresh
+
+_wakeup = threading.Event()
+_thread = None
+
+
+def enqueue_glb_job(artwork_id):
+    """Add a job in the caller's transaction; notify_glb_jobs() after the commit."""
+    job = GlbJob(artwork_id=artwork_id, status="queued", attempts=0)
+    db.session.add(job)
+    db.session.flush()
+    return job
+
+
+def notify_glb_jobs():
+    _wakeup.set()
+
+
+def pending_glb_job(artwork_id):
+    """The artwork's queued or running job, if any."""
+    return (
+        GlbJob.query.filter(GlbJob.artwork_id == artwork_id, GlbJob.status.in_(("queued", "running")))
+        .order_by(GlbJob.id.desc())
+        .first()
+    )
+
+
+def _ms(start, end):
+    if start is None or end is None:
+        return None
+    return round((end - start).total_seconds() * 1000, 1)
+
+
+def job_info(job):
+    return {
+        "id": job.id,
+        "artwork_id": job.artwork_id,
+        "status": job.status,
+        "attempts": job.attempts,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "queued_ms": _ms(job.created_at, job.started_at),
+        "run_ms": _ms(job.started_at, job.finished_at),
+        "timings_ms": json.loads(job.timings) if job.timings else None,
+    }
+
+
+def claim_jobs(limit):
+    """Mark up to `limit` queued jobs running, oldest first; returns their ids."""
+    ids = [
+        row.id for row in
+        db.session.query(GlbJob.id).filter_by(status="queued").order_by(GlbJob.id).limit(limit)
+    ]
+    claimed = []
+    for job_id in ids:
+        updated = (
+            db.session.query(GlbJob)
+            .filter_by(id=job_id, status="queued")
+            .update(
+                {GlbJob.status: "running", GlbJob.started_at: datetime.utcnow(), GlbJob.attempts: GlbJob.attempts + 1},
+                synchronize_session=False,
+            )
+        )
+        if updated:
+            claimed.append(job_id)
+    db.session.commit()
+    return claimed
+
+
+def _remove_artwork(artwork_id):
+    """Drop the artwork of a failed job, as DELETE /artworks/<id> would: it has
+    no GLB and never will, so it must not stay listed."""
+    artwork = db.session.get(Artwork, artwork_id)
+    if artwork is None:
+        return
+    db.session.delete(artwork)
+    bump_catalog_version(artwork_id)
+    queue_similarity_refresh(artwork_id)
+
+
+def _release(jobs, error, max_attempts):
+    """Put interrupted jobs back on the queue, or fail those out of attempts
+    (and remove their artworks)."""
+    for job in jobs:
+        if job.attempts >= max_attempts:
+            job.status = "failed"
+            job.error = f"{error} (after {job.attempts} attempts)"
+            job.finished_at = datetime.utcnow()
+            _remove_artwork(job.artwork_id)
+        else:
+            job.status = "queued"
+            job.started_at = None
+    db.session.commit()
+
+
+def requeue_interrupted(config):
+    """Jobs left running by a runner that is gone. Only the lock holder calls this."""
+    jobs = GlbJob.query.filter_by(status="running").all()
+    _release(jobs, "Interrupted", config.get("GLB_JOB_MAX_ATTEMPTS", 3))
+    return len(jobs)
+
+
+def _fail(job, error):
+    job.status = "failed"
+    job.error = error
+    job.finished_at = datetime.utcnow()
+    _remove_artwork(job.artwork_id)
+    db.session.commit()
+    print(f"GLB job {job.id} failed: {error}")
+
+
+def run_job(job_id):
+    """Build the GLB and derivatives for a claimed job and record the outcome."""
+    job = db.session.get(GlbJob, job_id)
+    if job is None:
+        return
+    artwork = db.session.get(Artwork, job.artwork_id)
+    if artwork is None:
+        return _fail(job, "Artwork was deleted")
+
+    try:
+        image_data = read_image(artwork)
+        timings = ingest_image(artwork, image_data, artwork.image_mime, store=False) if image_data else None
+        if timings is None:
+            db.session.rollback()
+            return _fail(db.session.get(GlbJob, job_id), "Failed to process image")
+        bump_catalog_version(artwork.id)
+        queue_similarity_refresh(artwork.id)
+        job.status = "done"
+        job.error = None
+        job.timings = json.dumps(timings)
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        _fail(db.session.get(GlbJob, job_id), f"Server error while processing image: {e}")
+
+
+# ----- process pool -----
+
+_worker_app = None
+
+
+def _init_worker(settings):
+    """Pool process start-up: an app of its own, with the parent's settings."""
+    global _worker_app
+    from . import create_app
+
+    for key, value in settings.items():
+        setattr(Config, key, value)
+    _worker_app = create_app()
+
+
+def _run_in_worker(job_id):
+    with _worker_app.app_context():
+        run_job(job_id)
+
+
+def _new_pool(app, workers):
+    settings = {key: app.config[key] for key in dir(Config) if key.isupper() and key in app.config}
+    # spawn, not fork: a forked child would inherit the runner's file lock and
+    # the web worker's threads and database connections
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(settings,),
+    )
+
+
+def pool_size(config):
+    return config.get("GLB_JOB_WORKERS", 1) or os.cpu_count() or 1
+
+
+def run_queue(app, workers=None, until_empty=False):
+    """Feed queued jobs to a process pool; the caller holds the runner lock.
+
+    Runs forever, or with `until_empty` until nothing is queued or running.
+    Returns the number of jobs finished.
+    """
+    config = app.config
+    workers = workers or pool_size(config)
+    interval = config.get("GLB_JOB_POLL_INTERVAL", 2)
+    max_attempts = config.get("GLB_JOB_MAX_ATTEMPTS", 3)
+
+    requeued = requeue_interrupted(config)
+    if requeued:
+        print(f"Requeued {requeued} interrupted GLB jobs")
+
+    pool = _new_pool(app, workers)
+    running = {}
+    finished = 0
+    try:
+        while True:
+            if len(running) < workers:
+                for job_id in claim_jobs(workers - len(running)):
+                    running[pool.submit(_run_in_worker, job_id)] = job_id
+            if not running:
+                if until_empty:
+                    return finished
+                _wakeup.wait(timeout=interval)
+                _wakeup.clear()
+                continue
+
+            done, _ = wait(running, timeout=interval, return_when=FIRST_COMPLETED)
+            broken = False
+            for future in done:
+                job_id = running.pop(future)
+                finished += 1
+                error = future.exception()
+                if error is None:
+                    continue
+                # the pool process died (e.g. killed for memory) or the job could not be sent
+                print(f"GLB job {job_id} interrupted: {error!r}")
+                db.session.expire_all()
+                _release([db.session.get(GlbJob, job_id)], "Interrupted", max_attempts)
+                broken = broken or isinstance(error, BrokenProcessPool)
+            if broken:
+                # every job still in the broken pool fails the same way and is released above
+                pool.shutdown(wait=False)
+                pool = _new_pool(app, workers)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _lock_path(app):
+    return os.path.join(app.instance_path, "glb-jobs.lock")
+
+
+def _runner_loop(app):
+    interval = app.config.get("GLB_JOB_POLL_INTERVAL", 2)
+    while True:
+        with app.app_context():
+            try:
+                with file_lock(_lock_path(app), blocking=False) as acquired:
+                    if acquired:
+                        run_queue(app)
+            except Exception as e:
+                db.session.rollback()
+                print(f"GLB job runner failed: {e}")
+        # another worker runs the queue; take over if it goes away
+        time.sleep(interval)
+
+
+def start_glb_job_runner(app):
+    """Run the job queue from this web worker (create_app(start_background=True)),
+    unless GLB_JOB_RUNNER_IN_APP is off; called again, it reuses the thread."""
+    global _thread
+    if _thread is not None or not app.config.get("GLB_JOB_RUNNER_IN_APP", True):
+        return _thread
+    _thread = threading.Thread(target=_runner_loop, args=(app,), name="glb-jobs", daemon=True)
+    _thread.start()
+    return _thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run queued GLB generation jobs")
+    parser.add_argument("--workers", type=int, help="pool processes (default GLB_JOB_WORKERS; 0 for one per core)")
+    parser.add_argument("--once", action="store_true", help="exit when the queue is empty")
+    args = parser.parse_args()
+
+    from . import create_app
+
+    app = create_app()
+    with app.app_context(), file_lock(_lock_path(app), blocking=False) as acquired:
+        if not acquired:
+            print("Another process is running the GLB job queue")
+            return
+        finished = run_queue(app, workers=args.workers, until_empty=args.once)
+        print(f"Finished {finished} GLB jobs")
+
+
+if __name__ == "__main__":
+    main()
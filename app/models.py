@@ -16,13 +16,35 @@ class Artwork(db.Model):
     dimensions = db.Column(db.String(100), nullable=True)
     medium = db.Column(db.String(100), nullable=True)
     style = db.Column(db.String(100), nullable=True)
-    image_data = db.Column(db.LargeBinary, nullable=False)
-    glb_data = db.Column(db.LargeBinary, nullable=True)
+    # Legacy inline blobs, empty once moved to the blob store (app/blobs.py).
+    # Deferred so ordinary Artwork loads never read them.
+    image_data = db.deferred(db.Column(db.LargeBinary, nullable=False))
+    glb_data = db.deferred(db.Column(db.LargeBinary, nullable=True))
+    image_sha256 = db.Column(db.String(64), nullable=True)
+    image_size = db.Column(db.Integer, nullable=True)
+    image_mime = db.Column(db.String(100), nullable=True)
+    image_width = db.Column(db.Integer, nullable=True)  # pixels, as uploaded
+    image_height = db.Column(db.Integer, nullable=True)
+    glb_sha256 = db.Column(db.String(64), nullable=True)
+    glb_size = db.Column(db.Integer, nullable=True)
+    glb_mime = db.Column(db.String(100), nullable=True)
+    image_modified_at = db.Column(db.DateTime, nullable=True)  # HTTP Last-Modified; created_at if unset
+    glb_modified_at = db.Column(db.DateTime, nullable=True)
+    # How the GLB was built (app/glb.py), for tuning and bulk regeneration
+    glb_texture_policy = db.Column(db.String(50), nullable=True)
+    glb_generation_ms = db.Column(db.Float, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     filename = db.Column(db.String(200), nullable=False)
 
     is_sold = db.Column(db.Boolean, default=False)
 
+    features = db.relationship(
+        "ArtworkFeature", uselist=False, cascade="all, delete-orphan", backref="artwork"
+    )
+    colors = db.relationship(
+        "ArtworkColor", cascade="all, delete-orphan", order_by="ArtworkColor.rank"
+    )
+
 
    
 
@@ -30,6 +52,84 @@ class Artwork(db.Model):
     def __repr__(self):
         return f"<Artwork {self.name}>"
 
+class ArtworkFeature(db.Model):
+    """Image features computed once at ingest so recommendations never decode blobs."""
+    __tablename__ = "artwork_feature"
+
+    artwork_id = db.Column(db.Integer, db.ForeignKey("artwork.id"), primary_key=True)
+    version = db.Column(db.String(32), nullable=False)
+    histogram = db.Column(db.LargeBinary, nullable=False)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<ArtworkFeature {self.artwork_id} {self.version}>"
+
+class ArtworkColor(db.Model):
+    """Dominant-colour palette entry, extracted at ingest (see app/palette.py)."""
+    __tablename__ = "artwork_color"
+
+    artwork_id = db.Column(db.Integer, db.ForeignKey("artwork.id"), primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    red = db.Column(db.Integer, nullable=False)
+    green = db.Column(db.Integer, nullable=False)
+    blue = db.Column(db.Integer, nullable=False)
+    weight = db.Column(db.Float, nullable=False)  # share of the image's pixels
+
+    @property
+    def hex(self):
+        return f"#{self.red:02x}{self.green:02x}{self.blue:02x}"
+
+class ArtworkSimilarity(db.Model):
+    """Precomputed top-K neighbours per artwork (see app/similar_artworks.py)."""
+    __tablename__ = "artwork_similarity"
+
+    artwork_id = db.Column(db.Integer, db.ForeignKey("artwork.id"), primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    similar_id = db.Column(db.Integer, db.ForeignKey("artwork.id"), nullable=False, index=True)
+    score = db.Column(db.Float, nullable=False)
+    catalog_version = db.Column(db.Integer, nullable=False)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class SimilarityRefresh(db.Model):
+    """Queue of artworks whose neighbour lists need recomputing."""
+    __tablename__ = "similarity_refresh_queue"
+
+    id = db.Column(db.Integer, primary_key=True)
+    artwork_id = db.Column(db.Integer, nullable=False)
+    enqueued_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class GlbJob(db.Model):
+    """Background build of an uploaded artwork's GLB and derivatives (app/jobs.py)."""
+    __tablename__ = "glb_job"
+
+    id = db.Column(db.Integer, primary_key=True)
+    artwork_id = db.Column(db.Integer, nullable=False, index=True)
+    # queued -> running -> done | failed
+    status = db.Column(db.String(20), nullable=False, default="queued", index=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)
+    timings = db.Column(db.Text)  # JSON {stage: ms} from the ingest
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+class CatalogState(db.Model):
+    """Single-row counter bumped by every catalog write, shared by all workers."""
+    __tablename__ = "catalog_state"
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class CatalogChange(db.Model):
+    """Artworks each catalog version bump touched, so workers can re-index just
+    those (app/catalog.py); a NULL artwork_id marks a write that did not say."""
+    __tablename__ = "catalog_change"
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, index=True)
+    artwork_id = db.Column(db.Integer)
+
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), nullable=False)
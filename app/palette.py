@@ -0,0 +1,264 @@
+"""
+Dominant-colour palettes and search by colour.
+
+At ingest a downscaled copy of the image is median-cut quantised into
+PALETTE_SIZE colours, stored in ``artwork_color`` with the share of pixels
+each one covers. Colour queries are answered from an in-memory index of all
+palette entries in CIELAB space, where Euclidean distance (Delta E 1976)
+roughly matches perceived colour difference; a tolerance of ~2 is barely
+noticeable, ~10-25 reads as "the same colour family".
+
+Backfill existing rows with:
+    python -m app.palette [--force] [--batch-size N]
+"""
+
+import re
+import argparse
+import threading
+import numpy as np
+from PIL import Image
+
+from .blobs import read_image
+from .catalog import bump_catalog_version, keep_current, version_after_write
+from .extensions import db
+from .features import sample_from_bytes
+from .models import Artwork, ArtworkColor
+
+PALETTE_SIZE = 5
+PALETTE_SAMPLE_SIZE = (64, 64)
+
+_HEX_RE = re.compile(r"^#?([0-9a-fA-F]{3}|[0-9a-fA-F]{6})$")
+
+
+def palette_from_image(img):
+    """[(r, g, b, weight), ...] most common first, weights summing to 1."""
+    small = img.convert("RGB").resize(PALETTE_SAMPLE_SIZE)
+    quantized = small.quantize(colors=PALETTE_SIZE, method=Image.Quantize.MEDIANCUT)
+    colors = quantized.getpalette()
+    counts = sorted(quantized.getcolors(), reverse=True)
+    total = float(sum(count for count, _ in counts))
+    return [
+        (colors[3 * i], colors[3 * i + 1], colors[3 * i + 2], count / total)
+        for count, i in counts
+    ]
+
+
+def palette_from_bytes(image_data):
+    try:
+        return palette_from_image(sample_from_bytes(image_data))
+    except Exception:
+        return None
+
+
+def store_palette(artwork, image_data=None, palette=None):
+    """Compute (unless given) and attach the palette to `artwork`; the caller commits."""
+    if palette is None:
+        palette = palette_from_bytes(image_data)
+    if palette is None:
+        return False
+    artwork.colors = [
+        ArtworkColor(rank=rank, red=r, green=g, blue=b, weight=weight)
+        for rank, (r, g, b, weight) in enumerate(palette)
+    ]
+    return True
+
+
+def parse_hex(value):
+    """(r, g, b) from "#rrggbb", "rrggbb" or "#rgb"; None if malformed."""
+    match = _HEX_RE.match((value or "").strip())
+    if not match:
+        return None
+    digits = match.group(1)
+    if len(digits) == 3:
+        digits = "".join(c * 2 for c in digits)
+    return tuple(int(digits[i:i + 2], 16) for i in (0, 2, 4))
+
+
+def rgb_to_lab(rgb):
+    """sRGB (0-255, shape (..., 3)) to CIELAB under D65."""
+    c = np.asarray(rgb, dtype=np.float32) / 255.0
+    c = np.where(c > 0.04045, ((c + 0.055) / 1.055) ** 2.4, c / 12.92)
+    xyz = c @ np.array([
+        [0.4124, 0.2126, 0.0193],
+        [0.3576, 0.7152, 0.1192],
+        [0.1805, 0.0722, 0.9505],
+    ], dtype=np.float32)
+    xyz /= np.array([0.95047, 1.0, 1.08883], dtype=np.float32)
+    f = np.where(xyz > 0.008856, np.cbrt(xyz), 7.787 * xyz + 16.0 / 116.0)
+    return np.stack([
+        116.0 * f[..., 1] - 16.0,
+        500.0 * (f[..., 0] - f[..., 1]),
+        200.0 * (f[..., 1] - f[..., 2]),
+    ], axis=-1)
+
+
+class ColorIndex:
+    """Palette entries of the whole catalog as flat arrays.
+
+    Writes go to per-artwork dicts; the arrays are recompiled lazily on the
+    next query after a change.
+    """
+
+    def __init__(self):
+        self.palettes = {}  # artwork_id -> [(r, g, b, weight), ...]
+        self.sold = {}  # artwork_id -> bool
+        self.version = None  # catalog version the index reflects
+        self._arrays = None
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.palettes)
+
+    def add(self, artwork_id, palette, is_sold=False):
+        with self._lock:
+            if palette:
+                self.palettes[artwork_id] = list(palette)
+                self.sold[artwork_id] = bool(is_sold)
+            else:
+                self.palettes.pop(artwork_id, None)
+                self.sold.pop(artwork_id, None)
+            self._arrays = None
+
+    def remove(self, artwork_id):
+        self.add(artwork_id, None)
+
+    def _compile(self):
+        ids, rgb, weights, sold = [], [], [], []
+        for artwork_id, palette in self.palettes.items():
+            for r, g, b, weight in palette:
+                ids.append(artwork_id)
+                rgb.append((r, g, b))
+                weights.append(weight)
+                sold.append(self.sold[artwork_id])
+        return (
+            np.array(ids, dtype=np.int64),
+            rgb_to_lab(np.array(rgb, dtype=np.float32).reshape(-1, 3)),
+            np.array(rgb, dtype=np.int32).reshape(-1, 3),
+            np.array(weights, dtype=np.float32),
+            np.array(sold, dtype=bool),
+        )
+
+    def query(self, rgb, tolerance=20.0, min_weight=0.05, only_unsold=True, limit=50):
+        """Artworks with a palette colour within `tolerance` (Delta E) of `rgb`
+        covering at least `min_weight` of the image.
+
+        Returns [(artwork_id, (r, g, b), weight, distance), ...], closest match
+        first, then the larger share of the image.
+        """
+        with self._lock:
+            if self._arrays is None:
+                self._arrays = self._compile()
+            ids, lab, colors, weights, sold = self._arrays
+
+        distance = np.linalg.norm(lab - rgb_to_lab(rgb), axis=1)
+        hits = np.flatnonzero((distance <= tolerance) & (weights >= min_weight) & ~(only_unsold & sold))
+        if len(hits) == 0:
+            return []
+
+        hits = hits[np.lexsort((ids[hits], -weights[hits], distance[hits]))]
+        # first (best) entry of each artwork, kept in ranked order
+        _, first = np.unique(ids[hits], return_index=True)
+        best = hits[np.sort(first)][:limit]
+        return [
+            (int(ids[i]), tuple(int(c) for c in colors[i]), float(weights[i]), float(distance[i]))
+            for i in best
+        ]
+
+
+def _add_palettes(index, artwork_ids=None):
+    """Add the stored palettes of `artwork_ids` (all artworks when None)."""
+    rows = (
+        db.session.query(
+            ArtworkColor.artwork_id, ArtworkColor.red, ArtworkColor.green,
+            ArtworkColor.blue, ArtworkColor.weight, Artwork.is_sold,
+        )
+        .join(Artwork, Artwork.id == ArtworkColor.artwork_id)
+        .order_by(ArtworkColor.artwork_id, ArtworkColor.rank)
+    )
+    if artwork_ids is not None:
+        rows = rows.filter(ArtworkColor.artwork_id.in_(artwork_ids))
+    palettes, sold = {}, {}
+    for row in rows:
+        palettes.setdefault(row.artwork_id, []).append((row.red, row.green, row.blue, row.weight))
+        sold[row.artwork_id] = row.is_sold
+    for artwork_id, palette in palettes.items():
+        index.add(artwork_id, palette, sold[artwork_id])
+    return index
+
+
+def build_color_index():
+    return _add_palettes(ColorIndex())
+
+
+def _reindex(index, artwork_ids):
+    for artwork_id in artwork_ids:
+        index.remove(artwork_id)
+    return _add_palettes(index, artwork_ids)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_color_index(catalog_version=None):
+    """The colour index this process answers colour searches from; palettes
+    written elsewhere since are re-read from artwork_color."""
+    global _index
+    with _index_lock:
+        _index = keep_current(_index, catalog_version, build_color_index, _reindex)
+        return _index
+
+
+def index_palette(artwork, catalog_version=None):
+    if _index is not None:
+        _index.add(artwork.id, [(c.red, c.green, c.blue, c.weight) for c in artwork.colors], artwork.is_sold)
+        _index.version = version_after_write(_index.version, catalog_version)
+
+
+def unindex_palette(artwork_id, catalog_version=None):
+    if _index is not None:
+        _index.remove(artwork_id)
+        _index.version = version_after_write(_index.version, catalog_version)
+
+
+def backfill_palettes(batch_size=50, force=False):
+    """Extract palettes for artworks that have none. Returns (processed, failed)."""
+    query = db.session.query(Artwork.id)
+    if not force:
+        query = query.filter(~Artwork.colors.any())
+    ids = [row.id for row in query.order_by(Artwork.id).all()]
+
+    processed = failed = 0
+    for start in range(0, len(ids), batch_size):
+        batch = Artwork.query.filter(Artwork.id.in_(ids[start:start + batch_size])).all()
+        for artwork in batch:
+            if store_palette(artwork, read_image(artwork)):
+                processed += 1
+            else:
+                failed += 1
+                print(f"Could not extract a palette for artwork {artwork.id}")
+        bump_catalog_version(*(artwork.id for artwork in batch))
+        db.session.commit()
+        db.session.expunge_all()
+        print(f"Backfilled {processed + failed}/{len(ids)} artworks")
+
+    return processed, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill dominant-colour palettes")
+    parser.add_argument("--force", action="store_true", help="re-extract every artwork's palette")
+    parser.add_argument("--batch-size", type=int, default=50)
+    args = parser.parse_args()
+
+    from . import create_app
+
+    app = create_app()
+    with app.app_context():
+        processed, failed = backfill_palettes(batch_size=args.batch_size, force=args.force)
+
+    print(f"Done: {processed} artworks updated, {failed} failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,7 @@ import hashlib
 import razorpay
 
 from flask import Blueprint, request, jsonify
+from .catalog import bump_catalog_version
 from .extensions import db
 from .models import Artwork
 from .auth import get_current_user   # 👈 important
@@ -110,6 +111,7 @@ def verify_payment():
 
     # ✅ Mark artwork sold
     artwork.is_sold = True
+    bump_catalog_version(artwork.id)
     db.session.commit()
 
     return jsonify({"success": True, "message": "Payment verified, artwork marked as sold"})
@@ -4,14 +4,15 @@ Processes images from data folder and adds them to the database with AI-generate
 """
 
 import os
-import io
 import random
-from PIL import Image
 import requests
 
 from .models import Artwork
 from .extensions import db
-from .artworks import create_glb_from_image
+from .catalog import bump_catalog_version
+from .ingest import ingest_image
+from .recommendations import artwork_saved
+from .similar_artworks import queue_similarity_refresh
 from . import create_app
 
 
@@ -148,14 +149,6 @@ and artistic technique. Do not mention the price or commercial aspects."""
             with open(image_path, "rb") as f:
                 image_data = f.read()
 
-            # Validate image
-            try:
-                img = Image.open(io.BytesIO(image_data))
-                img.verify()
-            except Exception as e:
-                print(f"Invalid image file {image_path}: {e}")
-                return False
-
             filename = os.path.basename(image_path)
             metadata = self.generate_artwork_metadata(filename)
 
@@ -168,12 +161,6 @@ and artistic technique. Do not mention the price or commercial aspects."""
             )
 
             print(f"Creating 3D model for {metadata['name']}...")
-            glb_bytes = create_glb_from_image(io.BytesIO(image_data))
-
-            if not glb_bytes:
-                print(f"Failed to create GLB for {image_path}")
-                return False
-
             artwork = Artwork(
                 name=metadata["name"],
                 description=description,
@@ -184,13 +171,19 @@ and artistic technique. Do not mention the price or commercial aspects."""
                 dimensions=metadata["dimensions"],
                 medium=metadata["medium"],
                 style=metadata["style"],
-                image_data=image_data,
-                glb_data=glb_bytes,
                 filename=filename
             )
+            # decodes once; an invalid image fails here
+            if ingest_image(artwork, image_data) is None:
+                print(f"Failed to ingest {image_path}")
+                return False
 
             db.session.add(artwork)
+            db.session.flush()
+            catalog_version = bump_catalog_version(artwork.id)
+            queue_similarity_refresh(artwork.id)
             db.session.commit()
+            artwork_saved(artwork, catalog_version)
 
             print(f"✅ Successfully added: {metadata['name']} by {metadata['artist']}")
             return True
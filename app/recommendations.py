@@ -1,68 +1,120 @@
-import io
-import re
-from PIL import Image
-from .models import Artwork
-
-def _image_histogram_from_bytes(b, size=(64, 64)):
-    try:
-        img = Image.open(io.BytesIO(b)).convert("RGB").resize(size)
-        return img.histogram()
-    except Exception:
-        return None
-
-def _histogram_intersection(h1, h2):
-    if not h1 or not h2:
-        return 0.0
-    s1 = sum(h1)
-    if s1 == 0:
-        return 0.0
-    inter = sum(min(a, b) for a, b in zip(h1, h2))
-    return inter / s1
-
-def _text_overlap_score(a_text, b_text):
-    if not a_text or not b_text:
-        return 0.0
-    a_words = set(re.findall(r"\w+", a_text.lower()))
-    b_words = set(re.findall(r"\w+", b_text.lower()))
-    if not a_words or not b_words:
-        return 0.0
-    return len(a_words & b_words) / len(a_words | b_words)
+import time
+from flask import current_app
+
+from .ann_index import add_to_ann_index, get_ann_index, remove_from_ann_index
+from .cache import VersionedLRUCache
+from .catalog import current_catalog_version
+from .features import histogram_from_bytes, unpack_histogram
+from .palette import index_palette, unindex_palette
+from .similar_artworks import notify_similarity_refresher
+from .similarity import get_engine, recommend_streaming, recommend_streaming_batch
+from .text_index import index_artwork, unindex_artwork
+
+_results = None
+
+def _result_cache(config):
+    global _results
+    if _results is None:
+        _results = VersionedLRUCache(maxsize=config.get("RECOMMENDATION_CACHE_SIZE", 1024))
+    return _results
+
+def recommendation_cache_stats():
+    return _result_cache(current_app.config).stats()
 
 def recommend_similar_artworks(artwork, top_n=5):
-    candidates = Artwork.query.filter(Artwork.id != artwork.id).all()
-    base_hist = _image_histogram_from_bytes(artwork.image_data)
-
-    scored = []
-    for c in candidates:
-        score = 0.0
-
-        if artwork.artist and c.artist and artwork.artist == c.artist:
-            score += 3.0
-        if artwork.style and c.style and artwork.style == c.style:
-            score += 2.0
-        if artwork.medium and c.medium and artwork.medium == c.medium:
-            score += 1.5
-        if artwork.artwork_type and c.artwork_type and artwork.artwork_type == c.artwork_type:
-            score += 1.0
-
-        score += _text_overlap_score(artwork.description, c.description) * 3.0
-
-        c_hist = _image_histogram_from_bytes(c.image_data)
-        hist_sim = _histogram_intersection(base_hist, c_hist)
-        score += hist_sim * 3.0
-
-        scored.append((score, c))
-
-    scored.sort(key=lambda x: x[0], reverse=True)
-
-    results = []
-    for s, art in scored[:top_n]:
-        results.append({
-            "id": art.id,
-            "name": art.name,
-            "artist": art.artist,
-            "style": art.style,
-            "medium": art.medium,
-            "score": round(s, 4)
-        })
+    config = current_app.config
+    mode = config.get("RECOMMENDATION_MODE", "exact")
+    text_scoring = config.get("RECOMMENDATION_TEXT_SCORING", "jaccard")
+
+    version = current_catalog_version()
+    cache = _result_cache(config)
+    key = (artwork.id, top_n, mode, text_scoring)
+    cached = cache.get(version, key)
+    if cached is not None:
+        return cached
+
+    if mode == "streaming":
+        recs = recommend_streaming(
+            artwork.id, top_n=top_n, text_scoring=text_scoring,
+            chunk_size=config.get("RECOMMENDATION_CHUNK_SIZE", 1000), catalog_version=version,
+        )
+        cache.put(version, key, recs)
+        return recs
+
+    engine = get_engine(version)
+    ann = get_ann_index(engine, config) if mode == "approximate" else None
+    recs = engine.recommend(
+        artwork.id, top_n=top_n, text_scoring=text_scoring,
+        ann=ann, ann_candidates=config.get("ANN_CANDIDATES", 500),
+    )
+    cache.put(version, key, recs)
+    return recs
+
+def recommend_batch(artwork_ids, top_n=5):
+    """Top-N for several artworks; cache misses are scored together in one pass
+    over the catalog instead of one full scan per artwork."""
+    config = current_app.config
+    mode = config.get("RECOMMENDATION_MODE", "exact")
+    text_scoring = config.get("RECOMMENDATION_TEXT_SCORING", "jaccard")
+
+    version = current_catalog_version()
+    cache = _result_cache(config)
+    results, missing = {}, []
+    for artwork_id in artwork_ids:
+        cached = cache.get(version, (artwork_id, top_n, mode, text_scoring))
+        if cached is not None:
+            results[artwork_id] = cached
+        else:
+            missing.append(artwork_id)
+
+    if missing and mode == "streaming":
+        found = recommend_streaming_batch(
+            missing, top_n=top_n, text_scoring=text_scoring,
+            chunk_size=config.get("RECOMMENDATION_CHUNK_SIZE", 1000), catalog_version=version,
+        )
+    elif missing:
+        # The batch is always exact, so it can fill the cache for either mode.
+        found = get_engine(version).recommend_batch(missing, top_n=top_n, text_scoring=text_scoring)
+    else:
+        found = {}
+    # Ids left out of `found` are not in the catalog; an artwork with no
+    # candidates is cached with its empty list like any other result.
+    for artwork_id, recs in found.items():
+        cache.put(version, (artwork_id, top_n, mode, text_scoring), recs)
+        results[artwork_id] = recs
     return results
+
+def search_similar_image(image_data, limit=12, only_unsold=False):
+    """Catalog artworks closest in colour to an uploaded image.
+
+    Returns (results, timings_ms), or (None, timings_ms) when the image cannot
+    be decoded. The upload is decoded once; scoring is one scan of the
+    engine's histogram matrix.
+    """
+    t0 = time.perf_counter()
+    hist = histogram_from_bytes(image_data)
+    t1 = time.perf_counter()
+    timings = {"decode": round((t1 - t0) * 1000, 2)}
+    if hist is None:
+        return None, timings
+
+    engine = get_engine(current_catalog_version())
+    t2 = time.perf_counter()
+    results = engine.search(hist, limit=limit, only_unsold=only_unsold)
+    timings["scoring"] = round((time.perf_counter() - t2) * 1000, 2)
+    timings["engine_load"] = round((t2 - t1) * 1000, 2)
+    return results, timings
+
+def artwork_saved(artwork, catalog_version):
+    """Update this worker's incremental indexes after a committed create/update."""
+    index_artwork(artwork, catalog_version)
+    index_palette(artwork, catalog_version)
+    if artwork.features is not None:
+        add_to_ann_index(artwork.id, unpack_histogram(artwork.features.histogram))
+    notify_similarity_refresher()
+
+def artwork_deleted(artwork_id, catalog_version):
+    unindex_artwork(artwork_id, catalog_version)
+    unindex_palette(artwork_id, catalog_version)
+    remove_from_ann_index(artwork_id)
+    notify_similarity_refresher()
@@ -0,0 +1,32 @@
+"""
+Additive schema upgrades for existing databases.
+
+``db.create_all()`` creates missing tables but never touches existing ones, so
+columns added to a model later are appended here with ALTER TABLE. Only
+nullable columns without server defaults are supported, which is what new
+model columns should be anyway.
+"""
+
+from sqlalchemy import inspect, text
+
+from .extensions import db
+
+
+def ensure_columns():
+    """Add model columns missing from their (already existing) tables."""
+    inspector = inspect(db.engine)
+    added = []
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
+                added.append(f"{table.name}.{column.name}")
+    if added:
+        print(f"Added columns: {', '.join(added)}")
+    return added
@@ -0,0 +1,277 @@
+"""
+Materialized "similar artworks" table.
+
+The top-K neighbours of every artwork are stored in ``artwork_similarity`` so
+the recommendations endpoint is a single indexed SELECT. Catalog writes put
+the artwork on ``similarity_refresh_queue`` and a background thread in each
+worker drains the queue, recomputing only the neighbour lists the change can
+affect:
+
+* the changed artwork itself,
+* artworks whose current list contains it (its score may have dropped),
+* artworks for which it now beats their K-th neighbour.
+
+All scores are symmetric (every histogram sums to the same pixel count), so
+one row of scores for the changed artwork answers the last question for the
+whole catalog. A file lock makes sure only one worker refreshes at a time.
+
+With RECOMMENDATION_MODE=streaming the rows come from the chunked catalog
+scan (similarity.iter_streaming_scores) instead of the in-memory engine, so
+the refresher never holds the whole catalog either.
+
+Full rebuild:
+    python -m app.similar_artworks --rebuild
+"""
+
+import os
+import time
+import argparse
+import threading
+import numpy as np
+from datetime import datetime
+from sqlalchemy import func
+from sqlalchemy.orm import aliased
+
+from .catalog import current_catalog_version
+from .extensions import db
+from .locks import file_lock
+from .models import Artwork, ArtworkSimilarity, SimilarityRefresh
+from .similarity import get_engine, iter_streaming_scores, recommend_streaming_batch, streaming_records
+
+_wakeup = threading.Event()
+_thread = None
+
+
+def queue_similarity_refresh(artwork_id):
+    """Enqueue inside the caller's transaction, next to the catalog version bump."""
+    db.session.add(SimilarityRefresh(artwork_id=artwork_id))
+
+
+def notify_similarity_refresher():
+    _wakeup.set()
+
+
+def pending_refresh_count():
+    return db.session.query(func.count(SimilarityRefresh.id)).scalar() or 0
+
+
+def materialized_recommendations(artwork_id, top_n=6):
+    """Stored neighbours for `artwork_id`, or None if none were computed yet."""
+    similar = aliased(Artwork)
+    rows = (
+        db.session.query(
+            ArtworkSimilarity.score, ArtworkSimilarity.computed_at,
+            similar.id, similar.name, similar.artist, similar.style, similar.medium,
+        )
+        .join(similar, similar.id == ArtworkSimilarity.similar_id)
+        .filter(ArtworkSimilarity.artwork_id == artwork_id)
+        .order_by(ArtworkSimilarity.rank)
+        .limit(top_n)
+        .all()
+    )
+    if not rows:
+        return None
+    return {
+        "recommendations": [
+            {
+                "id": r.id, "name": r.name, "artist": r.artist,
+                "style": r.style, "medium": r.medium, "score": round(r.score, 4),
+            }
+            for r in rows
+        ],
+        "computed_at": max(r.computed_at for r in rows).isoformat(),
+    }
+
+
+def _kth_scores(k):
+    """{artwork_id: the score a newcomer must beat to enter its stored list},
+    for the artworks whose list is full."""
+    rows = (
+        db.session.query(
+            ArtworkSimilarity.artwork_id,
+            func.min(ArtworkSimilarity.score),
+            func.count(ArtworkSimilarity.rank),
+        )
+        .group_by(ArtworkSimilarity.artwork_id)
+        .all()
+    )
+    return {artwork_id: min_score for artwork_id, min_score, count in rows if count >= k}
+
+
+def _engine_for(config, catalog_version):
+    """The in-memory engine, or None in streaming mode (score by scanning)."""
+    if config.get("RECOMMENDATION_MODE", "exact") == "streaming":
+        return None
+    return get_engine(catalog_version)
+
+
+def _beaten_by_changed(engine, changed, k, text_scoring, config, catalog_version):
+    """Artworks for which one of `changed` now beats their K-th neighbour."""
+    kth = _kth_scores(k)
+    beaten = set()
+    if engine is None:
+        queries = streaming_records(changed)
+        if not queries:
+            return beaten  # all deleted
+        chunks = iter_streaming_scores(
+            queries, text_scoring, config.get("RECOMMENDATION_CHUNK_SIZE", 1000), catalog_version,
+        )
+        for _, ids, rows in chunks:
+            thresholds = np.array([kth.get(i, -np.inf) for i in ids.tolist()], dtype=np.float32)
+            for scores in rows:
+                beaten.update(ids[scores > thresholds].tolist())
+        return beaten
+
+    thresholds = np.full(len(engine), -np.inf, dtype=np.float32)
+    for artwork_id, min_score in kth.items():
+        row = engine.row_of(artwork_id)
+        if row is not None:
+            thresholds[row] = min_score
+    for artwork_id in changed:
+        row = engine.row_of(artwork_id)
+        if row is None:
+            continue  # deleted
+        scores = engine.scores_for_row(row, text_scoring=text_scoring)
+        beaten.update(engine.ids[scores > thresholds].tolist())
+    return beaten
+
+
+def _affected_artworks(engine, entries, k, text_scoring, config, catalog_version):
+    changed = {e.artwork_id for e in entries}
+    affected = set(changed)
+
+    affected.update(
+        artwork_id for (artwork_id,) in
+        db.session.query(ArtworkSimilarity.artwork_id)
+        .filter(ArtworkSimilarity.similar_id.in_(changed))
+        .distinct()
+    )
+
+    affected.update(_beaten_by_changed(engine, changed, k, text_scoring, config, catalog_version))
+    return affected
+
+
+def _store_neighbours(engine, artwork_ids, k, text_scoring, config, catalog_version):
+    artwork_ids = list(artwork_ids)
+    now = datetime.utcnow()
+    for start in range(0, len(artwork_ids), 64):
+        chunk = artwork_ids[start:start + 64]
+        db.session.query(ArtworkSimilarity).filter(
+            ArtworkSimilarity.artwork_id.in_(chunk)
+        ).delete(synchronize_session=False)
+
+        mappings = []
+        if engine is None:
+            neighbours = recommend_streaming_batch(
+                chunk, top_n=k, text_scoring=text_scoring,
+                chunk_size=config.get("RECOMMENDATION_CHUNK_SIZE", 1000), catalog_version=catalog_version,
+            )
+        else:
+            neighbours = engine.recommend_batch(chunk, top_n=k, text_scoring=text_scoring)
+        for artwork_id, recs in neighbours.items():
+            for rank, rec in enumerate(recs):
+                mappings.append({
+                    "artwork_id": artwork_id, "rank": rank, "similar_id": rec["id"],
+                    "score": rec["score"], "catalog_version": catalog_version, "computed_at": now,
+                })
+        if mappings:
+            db.session.bulk_insert_mappings(ArtworkSimilarity, mappings)
+
+
+def refresh_pending(config, limit=500):
+    """Process up to `limit` queued changes. Returns how many were consumed."""
+    entries = db.session.query(SimilarityRefresh).order_by(SimilarityRefresh.id).limit(limit).all()
+    if not entries:
+        return 0
+
+    k = config.get("SIMILARITY_TOP_K", 12)
+    text_scoring = config.get("RECOMMENDATION_TEXT_SCORING", "jaccard")
+    version = current_catalog_version()
+    engine = _engine_for(config, version)
+
+    affected = _affected_artworks(engine, entries, k, text_scoring, config, version)
+    _store_neighbours(engine, affected, k, text_scoring, config, version)
+    db.session.query(SimilarityRefresh).filter(
+        SimilarityRefresh.id.in_([e.id for e in entries])
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return len(entries)
+
+
+def rebuild_all(config):
+    """Recompute every artwork's neighbours from scratch."""
+    k = config.get("SIMILARITY_TOP_K", 12)
+    text_scoring = config.get("RECOMMENDATION_TEXT_SCORING", "jaccard")
+    version = current_catalog_version()
+    engine = _engine_for(config, version)
+    max_queued = db.session.query(func.max(SimilarityRefresh.id)).scalar()
+    if engine is None:
+        artwork_ids = [artwork_id for (artwork_id,) in db.session.query(Artwork.id).order_by(Artwork.id)]
+    else:
+        artwork_ids = engine.ids.tolist()
+
+    db.session.query(ArtworkSimilarity).delete(synchronize_session=False)
+    _store_neighbours(engine, artwork_ids, k, text_scoring, config, version)
+    if max_queued is not None:
+        db.session.query(SimilarityRefresh).filter(
+            SimilarityRefresh.id <= max_queued
+        ).delete(synchronize_session=False)
+    db.session.commit()
+    return len(artwork_ids)
+
+
+def _lock_path(app):
+    return os.path.join(app.instance_path, "similarity-refresh.lock")
+
+
+def _refresh_loop(app):
+    interval = app.config.get("SIMILARITY_REFRESH_INTERVAL", 5)
+    while True:
+        _wakeup.wait(timeout=interval)
+        _wakeup.clear()
+        with app.app_context():
+            try:
+                with file_lock(_lock_path(app), blocking=False) as acquired:
+                    if acquired:
+                        while refresh_pending(app.config):
+                            pass
+            except Exception as e:
+                db.session.rollback()
+                print(f"Similarity refresh failed: {e}")
+                time.sleep(interval)
+
+
+def start_similarity_refresher(app):
+    """Start this process's refresh thread (once, even if create_app runs again)."""
+    global _thread
+    if _thread is not None or not app.config.get("SIMILARITY_REFRESH_ENABLED", True):
+        return _thread
+    _thread = threading.Thread(target=_refresh_loop, args=(app,), name="similarity-refresh", daemon=True)
+    _thread.start()
+    return _thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh the materialized similar-artworks table")
+    parser.add_argument("--rebuild", action="store_true", help="recompute neighbours for every artwork")
+    args = parser.parse_args()
+
+    from . import create_app
+
+    app = create_app()
+    with app.app_context(), file_lock(_lock_path(app)):
+        if args.rebuild:
+            count = rebuild_all(app.config)
+            print(f"Rebuilt neighbours for {count} artworks")
+        else:
+            total = 0
+            while True:
+                done = refresh_pending(app.config)
+                if not done:
+                    break
+                total += done
+            print(f"Processed {total} queued changes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,452 @@
+"""
+Vectorized similarity scoring over the whole catalog.
+
+The engine keeps every artwork's colour histogram in one contiguous float32
+matrix and the categorical metadata as integer-coded columns, so scoring a
+query artwork against N candidates is a handful of NumPy operations instead
+of a Python loop over rows.
+
+RECOMMENDATION_MODE = "streaming" skips the resident engine and text index
+altogether: each request scans the catalog in fixed-size chunks and keeps
+only a bounded heap of the best candidates per artwork asked for, trading
+latency for memory that does not grow with the catalog. The one resident
+piece is the term -> document count table tfidf text scoring needs, which
+grows with the vocabulary.
+"""
+
+import heapq
+import threading
+import numpy as np
+from itertools import islice
+
+from .catalog import keep_current
+from .extensions import db
+from .features import FEATURE_VERSION, HISTOGRAM_BINS, unpack_histogram
+from .models import Artwork, ArtworkFeature
+from .text_index import (
+    TextIndex, document_text, get_document_frequencies, get_text_index, term_counts, text_scores,
+)
+
+# (attribute, bonus when both artworks share the same non-empty value)
+METADATA_WEIGHTS = (
+    ("artist", 3.0),
+    ("style", 2.0),
+    ("medium", 1.5),
+    ("artwork_type", 1.0),
+)
+TEXT_WEIGHT = 3.0
+HISTOGRAM_WEIGHT = 3.0
+
+RESULT_FIELDS = ("id", "name", "artist", "style", "medium")
+
+
+class SimilarityEngine:
+    def __init__(self, records, text_index=None):
+        """Build from records exposing id, name, artist, style, medium,
+        artwork_type, description and histogram (array-like or None), and
+        optionally is_sold.
+
+        Text similarity comes from `text_index`; one is built from the records
+        when not given.
+        """
+        n = len(records)
+        self.ids = np.empty(n, dtype=np.int64)
+        self.histograms = np.zeros((n, HISTOGRAM_BINS), dtype=np.float32)
+        self.has_histogram = np.zeros(n, dtype=bool)
+        self.sold = np.zeros(n, dtype=bool)
+        self.codes = np.full((n, len(METADATA_WEIGHTS)), -1, dtype=np.int32)
+        self.weights = np.array([w for _, w in METADATA_WEIGHTS], dtype=np.float32)
+        self.meta = [None] * n
+        self._row = {}
+        self._vocab = [{} for _ in METADATA_WEIGHTS]
+        self.version = None  # catalog version the engine reflects
+        if text_index is None:
+            text_index = TextIndex.from_records(records)
+
+        for i, rec in enumerate(records):
+            self._encode(i, rec)
+        self.text = text_index.compile(self._row, n)
+
+    def _encode(self, row, rec):
+        self.ids[row] = rec.id
+        self._row[rec.id] = row
+        self.meta[row] = {f: getattr(rec, f) for f in RESULT_FIELDS}
+        self.histograms[row] = rec.histogram if rec.histogram is not None else 0
+        self.has_histogram[row] = rec.histogram is not None
+        self.sold[row] = bool(getattr(rec, "is_sold", False))
+        for col, (attr, _) in enumerate(METADATA_WEIGHTS):
+            value = getattr(rec, attr)
+            self.codes[row, col] = self._vocab[col].setdefault(value, len(self._vocab[col])) if value else -1
+
+    def updated(self, records, removed_ids, text_index):
+        """A copy with `records` added or replaced and `removed_ids` dropped.
+
+        Only those rows are encoded (text from `text_index`, already current);
+        everything else is copied array by array, so this is far cheaper than
+        a build. This engine is left as it was for requests still using it.
+        """
+        added = [rec for rec in records if rec.id not in self._row]
+        n = len(self) + len(added)
+        engine = SimilarityEngine.__new__(SimilarityEngine)
+        engine.ids = _resized(self.ids, n)
+        engine.histograms = _resized(self.histograms, n)
+        engine.has_histogram = _resized(self.has_histogram, n)
+        engine.sold = _resized(self.sold, n)
+        engine.codes = _resized(self.codes, n)
+        engine.weights = self.weights
+        engine.meta = self.meta + [None] * len(added)
+        engine._row = dict(self._row)
+        engine._vocab = [dict(vocab) for vocab in self._vocab]
+        engine.version = self.version
+        engine.text = self.text.updated(n)
+
+        next_row = len(self)
+        for rec in records:
+            row = engine._row.get(rec.id)
+            if row is None:
+                row, next_row = next_row, next_row + 1
+            engine._encode(row, rec)
+            engine.text.put(rec.id, row, text_index.documents.get(rec.id))
+
+        # each removed row is filled with the last one
+        last = n - 1
+        for artwork_id in removed_ids:
+            row = engine._row.pop(artwork_id, None)
+            if row is None:
+                continue
+            engine.text.remove(artwork_id, row)
+            if row != last:
+                moved = int(engine.ids[last])
+                for array in (engine.ids, engine.histograms, engine.has_histogram, engine.sold, engine.codes):
+                    array[row] = array[last]
+                engine.meta[row] = engine.meta[last]
+                engine._row[moved] = row
+                engine.text.move(moved, last, row)
+            last -= 1
+
+        n = last + 1
+        if n < len(engine.meta):
+            for attr in ("ids", "histograms", "has_histogram", "sold", "codes"):
+                setattr(engine, attr, getattr(engine, attr)[:n])
+            del engine.meta[n:]
+            engine.text = engine.text.updated(n)
+        return engine
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, artwork_id):
+        return artwork_id in self._row
+
+    def row_of(self, artwork_id):
+        return self._row.get(artwork_id)
+
+    def rows_of(self, artwork_ids):
+        rows = [self._row.get(i) for i in artwork_ids]
+        return np.array([r for r in rows if r is not None], dtype=np.int64)
+
+    def histogram_scores(self, query_hist, rows=None):
+        """Histogram intersection against every row (or only `rows`)."""
+        n = len(self) if rows is None else len(rows)
+        total = float(query_hist.sum()) if query_hist is not None else 0.0
+        if total == 0:
+            return np.zeros(n, dtype=np.float32)
+        matrix = self.histograms if rows is None else self.histograms[rows]
+        return np.minimum(matrix, query_hist).sum(axis=1) / total
+
+    def metadata_scores(self, query_codes):
+        matches = (self.codes == query_codes) & (query_codes >= 0)
+        return matches @ self.weights
+
+    def text_scores(self, artwork_id, mode="jaccard"):
+        return self.text.scores(artwork_id, mode=mode)
+
+    def _query_histogram(self, row):
+        hist = self.histograms[row]
+        return hist if hist.any() else None
+
+    def scores_for_row(self, row, text_scoring="jaccard"):
+        return self.scores_for_rows([row], text_scoring=text_scoring)[0]
+
+    def scores_for_rows(self, rows, text_scoring="jaccard", block_bytes=32 << 20):
+        """Score matrix (len(rows) x catalog) for several query rows at once.
+
+        Histogram intersections are computed block by block over the catalog,
+        each block a single broadcast minimum of at most `block_bytes`.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        n_queries, n = len(rows), len(self)
+        scores = np.zeros((n_queries, n), dtype=np.float32)
+
+        query_codes = self.codes[rows]
+        for col, weight in enumerate(self.weights):
+            q = query_codes[:, col][:, None]
+            scores += weight * ((self.codes[:, col][None, :] == q) & (q >= 0))
+
+        for i, row in enumerate(rows):
+            scores[i] += TEXT_WEIGHT * self.text_scores(int(self.ids[row]), mode=text_scoring)
+
+        query_hists = self.histograms[rows]
+        totals = query_hists.sum(axis=1)
+        scale = np.where(totals > 0, HISTOGRAM_WEIGHT / np.maximum(totals, 1), 0)[:, None]
+        block = max(1, block_bytes // (n_queries * HISTOGRAM_BINS * 4))
+        for start in range(0, n, block):
+            stop = min(start + block, n)
+            inter = np.minimum(query_hists[:, None, :], self.histograms[None, start:stop, :]).sum(axis=2)
+            scores[:, start:stop] += scale * inter
+
+        scores[np.arange(n_queries), rows] = -np.inf
+        return scores
+
+    def approximate_scores_for_row(self, row, ann, candidates=500, text_scoring="jaccard"):
+        """Like scores_for_row, but the histogram term is only computed for
+        the ANN colour neighbours plus the best metadata/text matches; every
+        other row scores -inf."""
+        base = (
+            self.metadata_scores(self.codes[row])
+            + TEXT_WEIGHT * self.text_scores(int(self.ids[row]), mode=text_scoring)
+        )
+        base[row] = -np.inf
+
+        query_hist = self._query_histogram(row)
+        colour_rows = (
+            self.rows_of(ann.query(query_hist, limit=candidates))
+            if query_hist is not None else np.empty(0, dtype=np.int64)
+        )
+        rows = np.union1d(colour_rows, self.top_k(base, candidates))
+        rows = rows[rows != row]
+
+        scores = np.full(len(self), -np.inf, dtype=np.float32)
+        scores[rows] = base[rows] + HISTOGRAM_WEIGHT * self.histogram_scores(query_hist, rows)
+        return scores
+
+    def top_k(self, scores, k):
+        """Indices of the k best scores, best first; ties broken by lower id."""
+        k = min(k, int(np.isfinite(scores).sum()))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+        if k < len(scores):
+            idx = np.argpartition(-scores, k - 1)[:k]
+        else:
+            idx = np.arange(len(scores))
+        order = np.lexsort((self.ids[idx], -scores[idx]))
+        return idx[order][:k]
+
+    def recommend(self, artwork_id, top_n=5, text_scoring="jaccard", ann=None, ann_candidates=500):
+        """Top-N similar artworks; exact full scan unless an ANN index is given."""
+        row = self.row_of(artwork_id)
+        if row is None:
+            return []
+        if ann is None:
+            scores = self.scores_for_row(row, text_scoring=text_scoring)
+        else:
+            scores = self.approximate_scores_for_row(
+                row, ann, candidates=ann_candidates, text_scoring=text_scoring
+            )
+        return [
+            dict(self.meta[i], score=round(float(scores[i]), 4))
+            for i in self.top_k(scores, top_n)
+        ]
+
+    def recommend_batch(self, artwork_ids, top_n=5, text_scoring="jaccard"):
+        """{artwork_id: top-N list} for every id in the catalog, scored in one pass."""
+        known = [i for i in artwork_ids if i in self._row]
+        if not known:
+            return {}
+        scores = self.scores_for_rows(self.rows_of(known), text_scoring=text_scoring)
+        return {
+            artwork_id: [
+                dict(self.meta[j], score=round(float(row_scores[j]), 4))
+                for j in self.top_k(row_scores, top_n)
+            ]
+            for artwork_id, row_scores in zip(known, scores)
+        }
+
+
+    def search(self, query_hist, limit=12, only_unsold=False):
+        """Artworks whose colour histogram best matches `query_hist`, e.g. the
+        histogram of an uploaded photo; scores are the histogram intersection."""
+        query_hist = np.asarray(query_hist, dtype=np.float32)
+        scores = self.histogram_scores(query_hist).astype(np.float32)
+        scores[~self.has_histogram] = -np.inf
+        if only_unsold:
+            scores[self.sold] = -np.inf
+        return [
+            dict(self.meta[i], is_sold=bool(self.sold[i]), score=round(float(scores[i]), 4))
+            for i in self.top_k(scores, limit)
+        ]
+
+
+def _resized(array, n):
+    """Copy of `array` with n rows, truncated or zero-padded."""
+    out = np.zeros((n,) + array.shape[1:], dtype=array.dtype)
+    out[:min(n, len(array))] = array[:n]
+    return out
+
+
+class _EngineRecord:
+    __slots__ = ("id", "name", "artist", "style", "medium", "artwork_type", "description", "is_sold", "histogram")
+
+    def __init__(self, row):
+        for field in self.__slots__[:-1]:
+            setattr(self, field, getattr(row, field))
+        if row.feature_histogram is not None and row.feature_version == FEATURE_VERSION:
+            self.histogram = unpack_histogram(row.feature_histogram)
+        else:
+            self.histogram = None
+
+
+def _candidate_query():
+    """Only the columns scoring needs: never the image or GLB blobs."""
+    return (
+        db.session.query(
+            Artwork.id, Artwork.name, Artwork.artist, Artwork.style,
+            Artwork.medium, Artwork.artwork_type, Artwork.description, Artwork.is_sold,
+            ArtworkFeature.version.label("feature_version"),
+            ArtworkFeature.histogram.label("feature_histogram"),
+        )
+        .outerjoin(ArtworkFeature, ArtworkFeature.artwork_id == Artwork.id)
+        .order_by(Artwork.id)
+    )
+
+
+def iter_candidate_chunks(chunk_size=1000, exclude_id=None):
+    """Yield lists of at most `chunk_size` records, streamed from the cursor."""
+    query = _candidate_query()
+    if exclude_id is not None:
+        query = query.filter(Artwork.id != exclude_id)
+    rows = iter(query.yield_per(chunk_size))
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield [_EngineRecord(row) for row in chunk]
+
+
+def build_engine(catalog_version=None):
+    records = [rec for chunk in iter_candidate_chunks() for rec in chunk]
+    engine = SimilarityEngine(records, text_index=get_text_index(catalog_version))
+    engine.version = catalog_version
+    return engine
+
+
+def _updated_engine(engine, artwork_ids, catalog_version):
+    records = [_EngineRecord(row) for row in _candidate_query().filter(Artwork.id.in_(artwork_ids))]
+    removed = set(artwork_ids) - {rec.id for rec in records}
+    return engine.updated(records, removed, get_text_index(catalog_version))
+
+
+def recommend_streaming(artwork_id, top_n=5, text_scoring="jaccard", chunk_size=1000, catalog_version=None):
+    """Exact top-N without a resident engine; [] for an unknown artwork."""
+    return recommend_streaming_batch(
+        [artwork_id], top_n=top_n, text_scoring=text_scoring,
+        chunk_size=chunk_size, catalog_version=catalog_version,
+    ).get(artwork_id, [])
+
+
+def streaming_records(artwork_ids):
+    """Scoring records for those of `artwork_ids` still in the catalog."""
+    return [_EngineRecord(row) for row in _candidate_query().filter(Artwork.id.in_(artwork_ids))]
+
+
+def iter_streaming_scores(queries, text_scoring="jaccard", chunk_size=1000, catalog_version=None):
+    """One scan of the catalog, scored against every record in `queries`.
+
+    Yields (chunk records, their ids, one score array per query) for each
+    chunk of at most `chunk_size` artworks; the scores are the ones
+    SimilarityEngine.scores_for_row gives (the query itself included).
+    """
+    frequencies = get_document_frequencies(catalog_version) if text_scoring == "tfidf" else None
+
+    query_terms = [term_counts(document_text(query)) for query in queries]
+    hist_scales = []
+    for query in queries:
+        total = float(query.histogram.sum()) if query.histogram is not None else 0.0
+        hist_scales.append(np.float32(HISTOGRAM_WEIGHT / total) if total > 0 else None)
+    empty_hist = np.zeros(HISTOGRAM_BINS, dtype=np.float32)
+
+    for chunk in iter_candidate_chunks(chunk_size):
+        n = len(chunk)
+        ids = np.fromiter((rec.id for rec in chunk), dtype=np.int64, count=n)
+        columns = {
+            attr: np.array([getattr(rec, attr) for rec in chunk], dtype=object) for attr, _ in METADATA_WEIGHTS
+        }
+        documents = [term_counts(document_text(rec)) for rec in chunk]
+        hists = None
+        if any(scale is not None for scale in hist_scales):
+            hists = np.stack([rec.histogram if rec.histogram is not None else empty_hist for rec in chunk])
+
+        rows = []
+        for query, terms, hist_scale in zip(queries, query_terms, hist_scales):
+            scores = np.zeros(n, dtype=np.float32)
+            for attr, weight in METADATA_WEIGHTS:
+                value = getattr(query, attr)
+                if value:
+                    scores += np.float32(weight) * (columns[attr] == value).astype(bool)
+            scores += TEXT_WEIGHT * text_scores(terms, documents, mode=text_scoring, frequencies=frequencies)
+            if hist_scale is not None:
+                scores += hist_scale * np.minimum(hists, query.histogram).sum(axis=1)
+            rows.append(scores)
+        yield chunk, ids, rows
+
+
+def recommend_streaming_batch(artwork_ids, top_n=5, text_scoring="jaccard", chunk_size=1000, catalog_version=None):
+    """{artwork_id: top-N list} for every id in the catalog, without a resident engine.
+
+    One scan of the catalog (iter_streaming_scores): each requested artwork
+    keeps only its `top_n` best in a min-heap, so peak memory depends on
+    `chunk_size`, `top_n` and the number of ids, not on the size of the
+    catalog. Ranking matches SimilarityEngine.recommend_batch.
+    """
+    queries = streaming_records(artwork_ids)
+    if top_n <= 0:
+        return {query.id: [] for query in queries}
+
+    heaps = [[] for _ in queries]  # (score, -id, record): each root is the weakest kept candidate
+    for chunk, ids, rows in iter_streaming_scores(queries, text_scoring, chunk_size, catalog_version):
+        for query, scores, heap in zip(queries, rows, heaps):
+            keep = ids != query.id
+            if len(heap) == top_n:
+                keep &= scores >= heap[0][0]
+            for i in np.flatnonzero(keep).tolist():
+                item = (float(scores[i]), -chunk[i].id, chunk[i])
+                if len(heap) < top_n:
+                    heapq.heappush(heap, item)
+                elif item[:2] > heap[0][:2]:
+                    heapq.heapreplace(heap, item)
+
+    return {
+        query.id: [
+            dict({f: getattr(rec, f) for f in RESULT_FIELDS}, score=round(score, 4))
+            for score, _, rec in sorted(heap, key=lambda item: item[:2], reverse=True)
+        ]
+        for query, heap in zip(queries, heaps)
+    }
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine(catalog_version=None):
+    """The engine this process scores with, at `catalog_version`.
+
+    Artworks written since its version are applied to a copy
+    (SimilarityEngine.updated); it is built from the whole catalog only at
+    start-up or when those writes are not known (catalog.keep_current).
+    """
+    global _engine
+    with _engine_lock:
+        _engine = keep_current(
+            _engine, catalog_version,
+            lambda: build_engine(catalog_version),
+            lambda engine, artwork_ids: _updated_engine(engine, artwork_ids, catalog_version),
+        )
+        return _engine
+
+
+def invalidate_engine():
+    """Drop the cached engine so the next request rebuilds it."""
+    global _engine
+    with _engine_lock:
+        _engine = None
@@ -0,0 +1,332 @@
+"""
+In-memory inverted index over artwork text (name, artist and description).
+
+Postings map each term to the artworks containing it together with the term
+frequency, so the text similarity of one artwork against the catalog is
+computed by walking only the postings of its own terms. Two scorings are
+supported:
+
+* ``jaccard`` - set overlap of the two term sets
+* ``tfidf``   - cosine similarity of log-tf * idf weighted term vectors
+
+The streaming recommender keeps no index: text_scores() compares documents
+read with each chunk, and tfidf only needs the DocumentFrequencies table.
+"""
+
+import math
+import re
+import threading
+import numpy as np
+from collections import Counter
+
+from .catalog import keep_current, version_after_write
+from .models import Artwork
+
+TEXT_FIELDS = ("name", "artist", "description")
+SCORING_MODES = ("jaccard", "tfidf")
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def document_text(artwork):
+    return " ".join(getattr(artwork, f) or "" for f in TEXT_FIELDS).strip()
+
+
+def term_counts(text):
+    if not text:
+        return Counter()
+    return Counter(_WORD_RE.findall(text.lower()))
+
+
+class TextIndex:
+    def __init__(self):
+        self.postings = {}  # term -> {artwork_id: tf}
+        self.documents = {}  # artwork_id -> {term: tf}
+        self.version = None  # catalog version the index reflects
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_records(cls, records):
+        index = cls()
+        for rec in records:
+            index.add(rec.id, document_text(rec))
+        return index
+
+    def __len__(self):
+        return len(self.documents)
+
+    def __contains__(self, artwork_id):
+        return artwork_id in self.documents
+
+    def add(self, artwork_id, text):
+        """Index (or re-index) one artwork's text."""
+        with self._lock:
+            self.remove(artwork_id)
+            counts = term_counts(text)
+            if not counts:
+                return
+            self.documents[artwork_id] = counts
+            for term, tf in counts.items():
+                self.postings.setdefault(term, {})[artwork_id] = tf
+
+    def remove(self, artwork_id):
+        with self._lock:
+            counts = self.documents.pop(artwork_id, None)
+            if counts is None:
+                return
+            for term in counts:
+                posting = self.postings.get(term)
+                if posting is not None:
+                    posting.pop(artwork_id, None)
+                    if not posting:
+                        del self.postings[term]
+
+    def compile(self, row_of, n_rows):
+        """Frozen, NumPy-backed copy of the index aligned to engine rows."""
+        with self._lock:
+            return TextScorer(self, row_of, n_rows)
+
+
+def _tf_weight(tf):
+    return 1.0 + np.log(tf)
+
+
+class DocumentFrequencies:
+    """How many artworks each term occurs in: all that tfidf needs from the
+    rest of the catalog when two documents are compared on their own."""
+
+    def __init__(self):
+        self.n_docs = 0
+        self.counts = Counter()
+        self.version = None  # catalog version the counts reflect
+
+    @classmethod
+    def from_records(cls, records):
+        frequencies = cls()
+        for rec in records:
+            counts = term_counts(document_text(rec))
+            if counts:
+                frequencies.n_docs += 1
+                frequencies.counts.update(counts.keys())
+        return frequencies
+
+    def idf(self, term):
+        return math.log((self.n_docs + 1) / (self.counts[term] + 1)) + 1.0
+
+
+def text_scores(query, documents, mode="jaccard", frequencies=None):
+    """Similarity of the term counts `query` to each of `documents` (term
+    counts, empty for an artwork without text).
+
+    Uses only the documents it is given and, for tfidf, the catalog's
+    DocumentFrequencies, so the streaming scan scores each chunk from its
+    own rows. Matches TextScorer.scores.
+    """
+    if mode not in SCORING_MODES:
+        raise ValueError(f"Unknown text scoring mode: {mode}")
+
+    scores = np.zeros(len(documents), dtype=np.float32)
+    if not query:
+        return scores
+    idf = {}
+
+    def weight(term, tf):
+        if term not in idf:
+            idf[term] = frequencies.idf(term)
+        return (1.0 + math.log(tf)) * idf[term]
+
+    if mode == "tfidf":
+        q_weights = {t: weight(t, tf) for t, tf in query.items()}
+        q_norm = math.sqrt(sum(w * w for w in q_weights.values()))
+
+    for i, doc in enumerate(documents):
+        shared = query.keys() & doc.keys()
+        if not shared:
+            continue
+        if mode == "jaccard":
+            scores[i] = len(shared) / (len(query) + len(doc) - len(shared))
+        else:
+            dot = sum(q_weights[t] * weight(t, doc[t]) for t in shared)
+            norm = math.sqrt(sum(weight(t, tf) ** 2 for t, tf in doc.items()))
+            scores[i] = dot / (q_norm * norm)
+    return scores
+
+
+class TextScorer:
+    """Postings as (rows, log-tf) arrays, so scoring a query walks only the
+    postings of its own terms with vectorized adds.
+
+    Compiled by SimilarityEngine from the live TextIndex on a full build and
+    carried over by updated() when the engine takes a few changed artworks.
+    tf-idf idfs and document norms depend on the whole catalog, so they are
+    computed on first use after either, rather than per query.
+    """
+
+    def __init__(self, index, row_of, n_rows):
+        self.n_rows = n_rows
+        self.documents = dict(index.documents)
+        self.term_counts = np.zeros(n_rows, dtype=np.float32)
+        self.postings = {}
+        self._idf = {}
+        self._norms = None
+
+        for term, posting in index.postings.items():
+            pairs = [(row_of[d], tf) for d, tf in posting.items() if d in row_of]
+            if not pairs:
+                continue
+            rows, tfs = zip(*pairs)
+            rows = np.array(rows, dtype=np.int64)
+            self.postings[term] = (rows, _tf_weight(np.array(tfs, dtype=np.float32)))
+            self.term_counts[rows] += 1
+
+    def idf(self, term):
+        if term not in self._idf:
+            self._idf[term] = math.log((len(self.documents) + 1) / (len(self.postings[term][0]) + 1)) + 1.0
+        return self._idf[term]
+
+    def norms(self):
+        if self._norms is None:
+            sq_norms = np.zeros(self.n_rows, dtype=np.float64)
+            for term, (rows, weights) in self.postings.items():
+                sq_norms[rows] += (weights * self.idf(term)) ** 2
+            self._norms = np.sqrt(sq_norms).astype(np.float32)
+        return self._norms
+
+    def updated(self, n_rows):
+        """Copy for the engine's updated(); its put/remove/move replace
+        postings arrays rather than write into the ones shared with this one."""
+        scorer = TextScorer.__new__(TextScorer)
+        scorer.n_rows = n_rows
+        scorer.documents = dict(self.documents)
+        scorer.term_counts = np.zeros(n_rows, dtype=np.float32)
+        scorer.term_counts[:min(n_rows, self.n_rows)] = self.term_counts[:n_rows]
+        scorer.postings = dict(self.postings)
+        scorer._idf = {}
+        scorer._norms = None
+        return scorer
+
+    def remove(self, artwork_id, row):
+        for term in self.documents.pop(artwork_id, ()):
+            if term not in self.postings:
+                continue
+            rows, weights = self.postings[term]
+            keep = rows != row
+            if keep.any():
+                self.postings[term] = (rows[keep], weights[keep])
+            else:
+                del self.postings[term]
+        self.term_counts[row] = 0
+
+    def put(self, artwork_id, row, counts):
+        self.remove(artwork_id, row)
+        if not counts:
+            return
+        self.documents[artwork_id] = counts
+        for term, tf in counts.items():
+            rows, weights = self.postings.get(term, (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)))
+            self.postings[term] = (np.append(rows, row), np.append(weights, _tf_weight(np.float32(tf))))
+        self.term_counts[row] = len(counts)
+
+    def move(self, artwork_id, src, dst):
+        for term in self.documents.get(artwork_id, ()):
+            if term in self.postings:
+                rows, weights = self.postings[term]
+                self.postings[term] = (np.where(rows == src, dst, rows), weights)
+        self.term_counts[dst] = self.term_counts[src]
+        self.term_counts[src] = 0
+
+    def scores(self, artwork_id, mode="jaccard"):
+        """Similarity of every row to `artwork_id`'s text (0 where no shared term)."""
+        if mode not in SCORING_MODES:
+            raise ValueError(f"Unknown text scoring mode: {mode}")
+
+        scores = np.zeros(self.n_rows, dtype=np.float32)
+        query = self.documents.get(artwork_id)
+        if not query:
+            return scores
+
+        if mode == "jaccard":
+            for term in query:
+                posting = self.postings.get(term)
+                if posting is not None:
+                    scores[posting[0]] += 1.0
+            hit = scores > 0
+            scores[hit] /= len(query) + self.term_counts[hit] - scores[hit]
+            return scores
+
+        q_norm_sq = 0.0
+        for term, q_tf in query.items():
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            idf = self.idf(term)
+            q_w = float(_tf_weight(q_tf)) * idf
+            q_norm_sq += q_w * q_w
+            rows, weights = posting
+            scores[rows] += q_w * idf * weights
+        hit = scores > 0
+        if q_norm_sq > 0:
+            scores[hit] /= math.sqrt(q_norm_sq) * self.norms()[hit]
+        return scores
+
+
+def _text_query():
+    return Artwork.query.with_entities(Artwork.id, Artwork.name, Artwork.artist, Artwork.description)
+
+
+def build_text_index():
+    return TextIndex.from_records(_text_query().all())
+
+
+def _reindex(index, artwork_ids):
+    rows = {row.id: row for row in _text_query().filter(Artwork.id.in_(artwork_ids))}
+    for artwork_id in artwork_ids:
+        if artwork_id in rows:
+            index.add(artwork_id, document_text(rows[artwork_id]))
+        else:
+            index.remove(artwork_id)
+    return index
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_text_index(catalog_version=None):
+    """Process-wide index; artworks another worker has written since this one
+    last indexed them are re-read (catalog.keep_current)."""
+    global _index
+    with _index_lock:
+        _index = keep_current(_index, catalog_version, build_text_index, _reindex)
+        return _index
+
+
+_frequencies = None
+
+
+def get_document_frequencies(catalog_version=None):
+    """Document frequencies for tfidf in the streaming scan, recounted in one
+    streamed pass over the artwork text when the catalog version changes."""
+    global _frequencies
+    with _index_lock:
+        if _frequencies is None or (catalog_version is not None and _frequencies.version != catalog_version):
+            _frequencies = DocumentFrequencies.from_records(_text_query().yield_per(1000))
+            _frequencies.version = catalog_version
+        return _frequencies
+
+
+def index_artwork(artwork, catalog_version=None):
+    """Keep the process-wide index current after a create or update.
+
+    `catalog_version` is the version this write bumped the catalog to; if the
+    index was current just before it, it stays current without a rebuild.
+    """
+    if _index is not None:
+        _index.add(artwork.id, document_text(artwork))
+        _index.version = version_after_write(_index.version, catalog_version)
+
+
+def unindex_artwork(artwork_id, catalog_version=None):
+    if _index is not None:
+        _index.remove(artwork_id)
+        _index.version = version_after_write(_index.version, catalog_version)
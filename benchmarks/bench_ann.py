@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Benchmark: recall vs latency of the LSH recommender (RECOMMENDATION_MODE =
+"approximate") against the exact full scan, on synthetic artworks:
+
+    python benchmarks/bench_ann.py --sizes 10000 50000 100000
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.ann_index import build_ann_index  # noqa: E402
+from app.similarity import SimilarityEngine  # noqa: E402
+from bench_recommendations import synthetic_artworks  # noqa: E402
+
+
+def timed(fn, queries):
+    t0 = time.perf_counter()
+    results = [fn(q) for q in queries]
+    return results, (time.perf_counter() - t0) * 1000 / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000, 100000])
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-n", type=int, default=6)
+    parser.add_argument("--configs", nargs="+", default=["8x12", "16x12", "8x16"],
+                        help="LSH settings as TABLESxBITS")
+    parser.add_argument("--candidates", type=int, nargs="+", default=[200, 500])
+    args = parser.parse_args()
+
+    print(f"{'artworks':>9} {'lsh':>6} {'cand':>5} {'build s':>8} {'exact ms':>9} {'approx ms':>10} {'recall@k':>9}")
+    for n in args.sizes:
+        engine = SimilarityEngine(synthetic_artworks(n))
+        queries = random.Random(1).sample(list(engine.ids.tolist()), min(args.queries, n))
+        exact, exact_ms = timed(lambda q: {r["id"] for r in engine.recommend(q, top_n=args.top_n)}, queries)
+
+        for config in args.configs:
+            tables, bits = (int(x) for x in config.split("x"))
+            t0 = time.perf_counter()
+            ann = build_ann_index(engine, n_tables=tables, n_bits=bits)
+            build_s = time.perf_counter() - t0
+
+            for candidates in args.candidates:
+                approx, approx_ms = timed(
+                    lambda q: {r["id"] for r in engine.recommend(
+                        q, top_n=args.top_n, ann=ann, ann_candidates=candidates)},
+                    queries,
+                )
+                recall = sum(len(a & e) for a, e in zip(approx, exact)) / sum(len(e) for e in exact)
+                print(f"{n:>9} {config:>6} {candidates:>5} {build_s:>8.2f} {exact_ms:>9.2f} "
+                      f"{approx_ms:>10.2f} {recall:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Benchmark: serving a GLB through gunicorn, before and after file-backed serving.
+
+Starts a one-worker gunicorn per scenario against a throwaway database and
+blob store, downloads the same GLB from several client threads and reports
+requests/s plus the worker's CPU time per request:
+
+* inline     - legacy row, streamed from SQLite in BLOB_CHUNK_SIZE chunks
+               (incremental blob I/O)
+* sendfile   - blob store file, BLOB_SERVE_MODE=direct (sendfile(2))
+* x-accel    - blob store file, BLOB_SERVE_MODE=x-accel (headers only;
+               measures what the worker still does when nginx sends the bytes)
+
+    python benchmarks/bench_blob_serving.py --size-mb 5 --seconds 5 --clients 4
+
+Requires gunicorn and psutil (both in requirements.txt).
+"""
+
+import os
+import sys
+import time
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from app.config import Config  # noqa: E402
+
+
+def _configure():
+    tmp = os.environ["BENCH_DIR"]
+    Config.SQLALCHEMY_DATABASE_URI = "sqlite:///" + os.path.join(tmp, "bench.db")
+    Config.BLOB_STORE_ROOT = os.path.join(tmp, "blobs")
+    Config.BLOB_SERVE_MODE = os.environ.get("BLOB_SERVE_MODE", "direct")
+    Config.SIMILARITY_REFRESH_ENABLED = False
+
+
+def make_app():
+    """gunicorn entry point: 'bench_blob_serving:make_app()'."""
+    _configure()
+    from app import create_app
+    return create_app()
+
+
+def seed(size_mb):
+    """One legacy (inline) and one blob-store artwork with the same GLB."""
+    from app.blobs import store_glb
+    from app.extensions import db
+    from app.models import Artwork
+
+    glb = os.urandom(size_mb << 20)
+    app = make_app()
+    with app.app_context():
+        inline = Artwork(name="inline", image_data=b"x", glb_data=glb, filename="inline.png")
+        stored = Artwork(name="stored", image_data=b"x", filename="stored.png")
+        store_glb(stored, glb)
+        db.session.add_all([inline, stored])
+        db.session.commit()
+        return inline.id, stored.id
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port, env):
+    proc = subprocess.Popen(
+        ["gunicorn", "-w", "1", "-b", f"127.0.0.1:{port}", "--chdir", BENCH_DIR, "bench_blob_serving:make_app()"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 20
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("gunicorn did not start")
+
+
+def load(port, path, seconds, clients):
+    counts, received = [0] * clients, [0] * clients
+    stop = time.time() + seconds
+
+    def client(i):
+        conn = http.client.HTTPConnection("127.0.0.1", port)
+        while time.time() < stop:
+            conn.request("GET", path)
+            resp = conn.getresponse()
+            body = resp.read()
+            if resp.status != 200:
+                raise RuntimeError(f"{path}: HTTP {resp.status}")
+            counts[i] += 1
+            received[i] += len(body)
+        conn.close()
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(counts), sum(received)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=5)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--clients", type=int, default=4)
+    args = parser.parse_args()
+
+    import psutil
+
+    tmp = tempfile.mkdtemp()
+    os.environ["BENCH_DIR"] = tmp
+    inline_id, stored_id = seed(args.size_mb)
+
+    scenarios = [
+        ("inline", inline_id, "direct"),
+        ("sendfile", stored_id, "direct"),
+        ("x-accel", stored_id, "x-accel"),
+    ]
+    print(f"{args.size_mb} MB GLB, {args.clients} clients, {args.seconds:.0f}s each")
+    print(f"{'scenario':>9} {'req/s':>8} {'MB/s':>8} {'worker CPU ms/req':>18}")
+    for name, artwork_id, mode in scenarios:
+        port = free_port()
+        proc = start_server(port, dict(os.environ, BLOB_SERVE_MODE=mode))
+        try:
+            path = f"/artwork/{artwork_id}/glb"
+            load(port, path, 0.5, 1)  # warm-up (app import, first queries)
+            worker = psutil.Process(proc.pid).children()[0]
+            before = worker.cpu_times()
+            t0 = time.perf_counter()
+            requests, received = load(port, path, args.seconds, args.clients)
+            elapsed = time.perf_counter() - t0
+            after = worker.cpu_times()
+        finally:
+            proc.terminate()
+            proc.wait()
+        cpu = (after.user - before.user) + (after.system - before.system)
+        print(f"{name:>9} {requests / elapsed:>8.1f} {received / elapsed / (1 << 20):>8.1f} "
+              f"{cpu * 1000 / max(requests, 1):>18.2f}")
+
+
+if __name__ == "__main__":
+    main()
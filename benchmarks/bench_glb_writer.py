@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Benchmark: GLB generation with the direct writer vs the trimesh export.
+
+For synthetic uploads of a few sizes, times the whole per-artwork generation
+(create_glb_from_image: decode, texture policy, write) and, given the same
+encoded texture, the direct writer against building the box in trimesh and
+running its exporter (which re-encodes the texture). Also reports what
+importing trimesh costs a fresh process. The two files are checked for
+equivalence in tests/test_glb_writer.py.
+
+    python benchmarks/bench_glb_writer.py --repeat 20
+
+Requires trimesh (in requirements.txt).
+"""
+
+import io
+import os
+import sys
+import time
+import argparse
+import subprocess
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.glb import create_glb_from_image, prepare_texture, write_box_glb  # noqa: E402
+
+POLICY = {"max_side": 2048, "format": "auto", "quality": 85}
+SIZES = [(800, 600), (3000, 2000), (6000, 4000)]
+
+
+def synthetic_jpeg(width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack([
+        128 + 100 * np.sin(x / 200), 128 + 100 * np.cos(y / 150), 128 + 100 * np.sin((x + y) / 300),
+    ], axis=-1)
+    pixels = np.clip(base + rng.normal(0, 12, base.shape), 0, 255).astype(np.uint8)
+    out = io.BytesIO()
+    Image.fromarray(pixels).save(out, "JPEG", quality=90)
+    return out.getvalue()
+
+
+def trimesh_glb(width, height, thickness, texture):
+    """The box as create_glb_from_image used to build it with trimesh."""
+    import trimesh
+
+    box = trimesh.creation.box(extents=(width, height, thickness))
+    box.apply_translation((0, 0, thickness / 2.0))
+    verts = box.vertices
+    min_xy = verts[:, :2].min(axis=0)
+    span_xy = np.maximum(verts[:, :2].max(axis=0) - min_xy, 1e-8)
+    uv = ((verts[:, :2] - min_xy) / span_xy).astype(np.float32)
+    box.visual = trimesh.visual.texture.TextureVisuals(uv=uv, image=Image.open(io.BytesIO(texture)))
+    glb = box.export(file_type="glb")
+    return glb if isinstance(glb, bytes) else glb.read()
+
+
+def timed(fn, repeat):
+    fn()  # warm-up
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) * 1000 / repeat
+
+
+def import_cost_ms():
+    def run(code):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], check=True)
+        return time.perf_counter() - t0
+    baseline = min(run("import numpy, PIL.Image") for _ in range(3))
+    with_trimesh = min(run("import numpy, PIL.Image, trimesh") for _ in range(3))
+    return (with_trimesh - baseline) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"importing trimesh: {import_cost_ms():.0f} ms per fresh process")
+    print(f"{'upload':>10} {'generate ms':>12} {'writer ms':>10} {'trimesh ms':>11} {'GLB KiB':>8}")
+    for width, height in SIZES:
+        upload = synthetic_jpeg(width, height)
+        texture, mimetype, (tw, th), _ = prepare_texture(Image.open(io.BytesIO(upload)), POLICY)
+        W, T = 0.6, 0.01
+        H = W * th / tw
+
+        generate_ms = timed(lambda: create_glb_from_image(io.BytesIO(upload), policy=POLICY), max(args.repeat // 5, 1))
+        writer_ms = timed(lambda: write_box_glb(W, H, T, texture, mimetype), args.repeat)
+        trimesh_ms = timed(lambda: trimesh_glb(W, H, T, texture), args.repeat)
+        size = len(write_box_glb(W, H, T, texture, mimetype))
+        print(f"{f'{width}x{height}':>10} {generate_ms:>12.1f} {writer_ms:>10.3f} {trimesh_ms:>11.1f} {size / 1024:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Benchmark: single-decode ingest vs decoding the upload once per derivative.
+
+For synthetic uploads of a few sizes, times the per-stage ingest pipeline
+(app/ingest.py) against the previous sequence, in which the GLB, the stored
+image's mime sniff, the features, the palette and every thumbnail each
+opened and decoded the upload on their own. Uses a throwaway database,
+blob store and derivative cache.
+
+    python benchmarks/bench_ingest.py --repeat 3
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import Config  # noqa: E402
+from bench_glb_writer import synthetic_jpeg  # noqa: E402
+
+SIZES = [(800, 600), (3000, 2000), (6000, 4000)]
+
+
+def separate_decodes(artwork, image_data, config):
+    """The ingest as it was: every step decodes `image_data` itself."""
+    from app.blobs import get_blob_store, store_image
+    from app.features import store_features
+    from app.glb import generate_glb
+    from app.palette import store_palette
+    from app.thumbnails import get_image_variant
+
+    generate_glb(artwork, image_data)
+    store_image(artwork, image_data)
+    store_features(artwork, image_data)
+    store_palette(artwork, image_data)
+    # thumbnails were then rendered from the stored file on first request
+    path = get_blob_store().path(artwork.image_sha256)
+    for width in config["THUMBNAIL_WIDTHS"]:
+        get_image_variant(artwork.image_sha256, path, config, width)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    Config.SQLALCHEMY_DATABASE_URI = "sqlite:///" + os.path.join(tmp, "bench.db")
+    Config.BLOB_STORE_ROOT = os.path.join(tmp, "blobs")
+    Config.DERIVATIVE_CACHE_ROOT = os.path.join(tmp, "derivatives")
+    Config.SIMILARITY_REFRESH_ENABLED = False
+
+    from app import create_app
+    from app.derivatives import _caches
+    from app.ingest import ingest_image
+    from app.models import Artwork
+
+    app = create_app()
+    with app.app_context():
+        for width, height in SIZES:
+            upload = synthetic_jpeg(width, height)
+            stages, before, after = {}, [], []
+            for seed in range(args.repeat):
+                # a different upload each round, so nothing comes from the caches
+                data = upload + bytes([seed])
+
+                def fresh():
+                    shutil.rmtree(Config.DERIVATIVE_CACHE_ROOT, ignore_errors=True)
+                    _caches.clear()
+                    return Artwork(name=f"bench {seed}", filename="bench.jpg")
+
+                artwork = fresh()
+                t0 = time.perf_counter()
+                separate_decodes(artwork, data, app.config)
+                before.append((time.perf_counter() - t0) * 1000)
+
+                artwork = fresh()
+                timings = ingest_image(artwork, data)
+                after.append(timings["total"])
+                for stage, ms in timings.items():
+                    stages.setdefault(stage, []).append(ms)
+
+            print(f"\n{width}x{height} JPEG ({len(upload) / 1024:.0f} KiB), mean of {args.repeat}:")
+            print(f"  separate decodes  {sum(before) / len(before):8.1f} ms")
+            print(f"  single decode     {sum(after) / len(after):8.1f} ms")
+            for stage, values in stages.items():
+                if stage != "total":
+                    print(f"    {stage:<14}{sum(values) / len(values):8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
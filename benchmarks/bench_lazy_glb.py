@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Benchmark: eager vs lazy GLB generation (GLB_GENERATION).
+
+First the ingest: uploads per second through ingest_image with the GLB built
+at upload (eager) and without it (lazy). Then the first download in lazy
+mode: for each artwork, --clients processes request /artwork/<id>/glb at
+the same moment; reports first-hit latency (the request that built the GLB
+and the ones that waited for it) against a warm hit, and checks that every
+burst produced exactly one generation. Exits 1 if one did not.
+
+Uses a throwaway database, blob store and derivative cache.
+
+    python benchmarks/bench_lazy_glb.py --uploads 10 --clients 8
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import Config  # noqa: E402
+from bench_glb_writer import synthetic_jpeg  # noqa: E402
+
+UPLOAD_SIZE = (3000, 2000)
+
+_client = None
+_barrier = None
+
+
+def _configure(settings):
+    for key, value in settings.items():
+        setattr(Config, key, value)
+
+
+def _init_client(settings, barrier):
+    global _client, _barrier
+    _configure(settings)
+    from app import create_app
+
+    _client = create_app().test_client()
+    _barrier = barrier
+
+
+def _fetch(artwork_id, burst=True):
+    if burst:
+        _barrier.wait(timeout=60)
+    t0 = time.perf_counter()
+    response = _client.get(f"/artwork/{artwork_id}/glb")
+    elapsed = (time.perf_counter() - t0) * 1000
+    return response.status_code, elapsed, "X-GLB-Generation-Ms" in response.headers, len(response.data)
+
+
+def ingest_rate(app, mode, uploads):
+    from app.derivatives import _caches
+    from app.extensions import db
+    from app.ingest import ingest_image
+    from app.models import Artwork
+
+    app.config["GLB_GENERATION"] = mode
+    upload = synthetic_jpeg(*UPLOAD_SIZE)
+    elapsed = 0.0
+    for i in range(uploads):
+        shutil.rmtree(Config.DERIVATIVE_CACHE_ROOT, ignore_errors=True)
+        _caches.clear()
+        # a different upload each round, so nothing comes from the caches
+        data = upload + f"{mode}{i}".encode()
+        artwork = Artwork(name=f"{mode} {i}", filename="bench.jpg")
+        t0 = time.perf_counter()
+        ingest_image(artwork, data)
+        elapsed += time.perf_counter() - t0
+        db.session.add(artwork)
+        db.session.commit()
+    return uploads / elapsed, artwork.id
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uploads", type=int, default=10)
+    parser.add_argument("--clients", type=int, default=8)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    settings = {
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///" + os.path.join(tmp, "bench.db"),
+        "BLOB_STORE_ROOT": os.path.join(tmp, "blobs"),
+        "DERIVATIVE_CACHE_ROOT": os.path.join(tmp, "derivatives"),
+        "SIMILARITY_REFRESH_ENABLED": False,
+        "GLB_JOB_RUNNER_IN_APP": False,
+        "GLB_GENERATION": "lazy",
+    }
+    _configure(settings)
+
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        eager, _ = ingest_rate(app, "eager", args.uploads)
+        lazy, last_id = ingest_rate(app, "lazy", args.uploads)
+    lazy_ids = list(range(last_id - args.uploads + 1, last_id + 1))
+    print(f"ingest of {UPLOAD_SIZE[0]}x{UPLOAD_SIZE[1]} JPEGs: eager {eager:.2f}/s, lazy {lazy:.2f}/s "
+          f"({lazy / eager:.1f}x)")
+
+    ctx = multiprocessing.get_context("spawn")
+    barrier = ctx.Barrier(args.clients)
+    builders, waiters, warm, failures = [], [], [], []
+    with ctx.Pool(args.clients, initializer=_init_client, initargs=(settings, barrier)) as pool:
+        for artwork_id in lazy_ids:
+            results = pool.map(_fetch, [artwork_id] * args.clients, chunksize=1)
+            generated = [r for r in results if r[2]]
+            if len(generated) != 1 or any(r[0] != 200 for r in results) or len({r[3] for r in results}) != 1:
+                failures.append(f"artwork {artwork_id}: {len(generated)} generations, "
+                                f"statuses {sorted({r[0] for r in results})}")
+            builders += [r[1] for r in generated]
+            waiters += [r[1] for r in results if not r[2]]
+            warm.append(pool.apply(_fetch, (artwork_id, False))[1])
+
+    def mean(values):
+        return sum(values) / len(values) if values else 0.0
+
+    print(f"first download, {args.clients} concurrent clients per artwork, mean of {len(lazy_ids)} artworks:")
+    print(f"  request that built the GLB  {mean(builders):8.1f} ms")
+    print(f"  requests that waited for it {mean(waiters):8.1f} ms")
+    print(f"  warm hit                    {mean(warm):8.1f} ms")
+    shutil.rmtree(tmp, ignore_errors=True)
+
+    if failures:
+        print("\n".join(["NOT single-flight:"] + failures))
+        sys.exit(1)
+    print(f"single-flight: each burst of {args.clients} first requests built the GLB once")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Benchmark: dominant-colour palette extraction per image, and search-by-colour
+latency of the in-memory ColorIndex, on synthetic data (no database needed):
+
+    python benchmarks/bench_palette.py --images 50 --sizes 1000 10000
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.palette import PALETTE_SIZE, ColorIndex, palette_from_image  # noqa: E402
+
+
+def synthetic_image(rng, size=(1600, 1200)):
+    """A few colour blocks with noise, roughly like a photographed painting."""
+    w, h = size
+    pixels = np.empty((h, w, 3), dtype=np.uint8)
+    cuts = np.sort(rng.integers(0, w, size=4))
+    for start, stop in zip(np.r_[0, cuts], np.r_[cuts, w]):
+        pixels[:, start:stop] = rng.integers(0, 256, size=3)
+    noise = rng.integers(-20, 21, size=pixels.shape)
+    return Image.fromarray(np.clip(pixels.astype(np.int16) + noise, 0, 255).astype(np.uint8))
+
+
+def synthetic_index(n, rng):
+    index = ColorIndex()
+    for artwork_id in range(1, n + 1):
+        weights = rng.dirichlet(np.ones(PALETTE_SIZE))
+        rgb = rng.integers(0, 256, size=(PALETTE_SIZE, 3))
+        index.add(
+            artwork_id,
+            [(*map(int, c), float(wt)) for c, wt in zip(rgb, weights)],
+            is_sold=bool(rng.random() < 0.2),
+        )
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=50)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--tolerance", type=float, default=20.0)
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    images = [synthetic_image(rng) for _ in range(args.images)]
+    t0 = time.perf_counter()
+    for img in images:
+        palette_from_image(img)
+    per_image = (time.perf_counter() - t0) * 1000 / len(images)
+    print(f"palette extraction: {per_image:.2f} ms/image ({images[0].size[0]}x{images[0].size[1]}, decoded)")
+
+    print(f"{'artworks':>9} {'compile ms':>11} {'query ms':>9} {'p95 ms':>8} {'avg hits':>9}")
+    for n in args.sizes:
+        index = synthetic_index(n, rng)
+        colors = rng.integers(0, 256, size=(args.queries, 3))
+
+        t0 = time.perf_counter()
+        index.query(colors[0], tolerance=args.tolerance)  # first query compiles the arrays
+        compile_ms = (time.perf_counter() - t0) * 1000
+
+        latencies, hits = [], 0
+        for rgb in colors:
+            t0 = time.perf_counter()
+            hits += len(index.query(rgb, tolerance=args.tolerance, limit=n))
+            latencies.append((time.perf_counter() - t0) * 1000)
+        print(f"{n:>9} {compile_ms:>11.1f} {np.mean(latencies):>9.3f} "
+              f"{np.percentile(latencies, 95):>8.3f} {hits / args.queries:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Benchmark: the original pure-Python recommendation scoring vs the vectorized
+SimilarityEngine.
+
+The reference is recommend_similar_artworks as it was before the engine
+(baseline commit 02d0694), copied below. Uses synthetic artworks (random
+histograms, metadata and descriptions), so no database is needed:
+
+    python benchmarks/bench_recommendations.py --sizes 1000 10000 100000
+"""
+
+import os
+import re
+import sys
+import time
+import random
+import argparse
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.similarity import SimilarityEngine  # noqa: E402
+from app.text_index import document_text  # noqa: E402
+
+ARTISTS = [f"Artist {i}" for i in range(40)]
+STYLES = ["abstract", "realistic", "impressionist", "cubist", "minimalist", "pop_art", "modern"]
+MEDIUMS = ["oil", "acrylic", "watercolor", "ink", "digital", "charcoal"]
+TYPES = ["painting", "sculpture", "digital", "photography", "print"]
+WORDS = [f"word{i}" for i in range(5000)]
+
+
+def synthetic_artworks(n, seed=0, palettes=50):
+    rng = np.random.default_rng(seed)
+    rnd = random.Random(seed)
+    # Artworks are noisy variations of a few base palettes, like a real catalog
+    bases = rng.dirichlet(np.ones(256) * 0.3, size=(palettes, 3))
+    records = []
+    for i in range(1, n + 1):
+        base = bases[rng.integers(palettes)]
+        # 64x64 image -> 4096 pixels counted once per channel
+        hist = np.concatenate([
+            rng.multinomial(4096, 0.8 * base[ch] + 0.2 * rng.dirichlet(np.ones(256) * 0.3))
+            for ch in range(3)
+        ])
+        records.append(SimpleNamespace(
+            id=i,
+            name=f"Artwork {i}",
+            artist=rnd.choice(ARTISTS),
+            style=rnd.choice(STYLES),
+            medium=rnd.choice(MEDIUMS),
+            artwork_type=rnd.choice(TYPES),
+            # Zipf-like word frequencies, as in real descriptions
+            description=" ".join(WORDS[min(int(rng.zipf(1.3)), len(WORDS)) - 1] for _ in range(rnd.randint(5, 25))),
+            histogram=hist.astype(np.float32),
+        ))
+    return records
+
+
+# ----- baseline (02d0694 app/recommendations.py) -----
+# Copied unchanged except where marked: candidates are passed in instead of
+# queried, and histograms are the synthetic ones instead of decoded images.
+
+def _histogram_intersection(h1, h2):
+    if not h1 or not h2:
+        return 0.0
+    s1 = sum(h1)
+    if s1 == 0:
+        return 0.0
+    inter = sum(min(a, b) for a, b in zip(h1, h2))
+    return inter / s1
+
+def _text_overlap_score(a_text, b_text):
+    if not a_text or not b_text:
+        return 0.0
+    a_words = set(re.findall(r"\w+", a_text.lower()))
+    b_words = set(re.findall(r"\w+", b_text.lower()))
+    if not a_words or not b_words:
+        return 0.0
+    return len(a_words & b_words) / len(a_words | b_words)
+
+def recommend_similar_artworks(artwork, all_artworks, top_n=5):
+    candidates = [c for c in all_artworks if c.id != artwork.id]  # was: Artwork.query
+    base_hist = artwork.histogram.tolist()  # was: decoded from artwork.image_data
+
+    scored = []
+    for c in candidates:
+        score = 0.0
+
+        if artwork.artist and c.artist and artwork.artist == c.artist:
+            score += 3.0
+        if artwork.style and c.style and artwork.style == c.style:
+            score += 2.0
+        if artwork.medium and c.medium and artwork.medium == c.medium:
+            score += 1.5
+        if artwork.artwork_type and c.artwork_type and artwork.artwork_type == c.artwork_type:
+            score += 1.0
+
+        score += _text_overlap_score(artwork.description, c.description) * 3.0
+
+        c_hist = c.histogram.tolist()  # was: decoded from c.image_data
+        hist_sim = _histogram_intersection(base_hist, c_hist)
+        score += hist_sim * 3.0
+
+        scored.append((score, c))
+
+    scored.sort(key=lambda x: x[0], reverse=True)
+
+    results = []
+    for s, art in scored[:top_n]:
+        results.append({
+            "id": art.id,
+            "name": art.name,
+            "artist": art.artist,
+            "style": art.style,
+            "medium": art.medium,
+            "score": round(s, 4)
+        })
+    return results
+
+# ----- end of baseline -----
+
+
+def baseline_records(records):
+    """The records as the baseline sees them. Its text term read the
+    description only; the engine's covers name, artist and description
+    (app/text_index.py), so that is what the baseline is given."""
+    return [SimpleNamespace(**dict(vars(r), description=document_text(r))) for r in records]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=5)
+    parser.add_argument("--top-n", type=int, default=6)
+    parser.add_argument("--reference-max", type=int, default=100000,
+                        help="skip the pure-Python scorer above this catalog size")
+    parser.add_argument("--text-scoring", choices=["jaccard", "tfidf"], default="jaccard",
+                        help="engine text scoring; the reference scorer only implements jaccard")
+    args = parser.parse_args()
+
+    print(f"{'artworks':>9} {'build s':>9} {'engine ms':>10} {'python ms':>10} {'speedup':>8}  ranking")
+    for n in args.sizes:
+        records = synthetic_artworks(n)
+
+        t0 = time.perf_counter()
+        engine = SimilarityEngine(records)
+        build_s = time.perf_counter() - t0
+
+        queries = random.Random(1).sample(records, min(args.queries, n))
+
+        t0 = time.perf_counter()
+        fast = [engine.recommend(q.id, top_n=args.top_n, text_scoring=args.text_scoring) for q in queries]
+        engine_ms = (time.perf_counter() - t0) * 1000 / len(queries)
+
+        if n > args.reference_max or args.text_scoring != "jaccard":
+            print(f"{n:>9} {build_s:>9.2f} {engine_ms:>10.2f} {'-':>10} {'-':>8}  (reference skipped)")
+            continue
+
+        t0 = time.perf_counter()
+        reference = baseline_records(records)
+        by_id = {r.id: r for r in reference}
+        slow = [recommend_similar_artworks(by_id[q.id], reference, args.top_n) for q in queries]
+        python_ms = (time.perf_counter() - t0) * 1000 / len(queries)
+
+        same = all(
+            [r["id"] for r in f] == [r["id"] for r in s]
+            and np.allclose([r["score"] for r in f], [r["score"] for r in s], atol=1e-3)
+            for f, s in zip(fast, slow)
+        )
+        print(f"{n:>9} {build_s:>9.2f} {engine_ms:>10.2f} {python_ms:>10.1f} "
+              f"{python_ms / engine_ms:>7.0f}x  {'identical' if same else 'MISMATCH'}")
+
+
+if __name__ == "__main__":
+    main()
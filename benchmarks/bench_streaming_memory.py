@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark: peak memory of one recommendation request in RECOMMENDATION_MODE =
+"streaming" as the catalog grows, next to the resident engine build.
+
+Fills a throwaway SQLite database with synthetic artworks (each carrying an
+image blob, which the scan must never load) and measures the tracemalloc peak
+of recommend_streaming() for every size, text scoring included: nothing is
+built before the measured request. Reporting only: the flat-peak check runs
+as tests/test_streaming_memory.py.
+
+With --text-scoring tfidf the document-frequency table the scan needs is
+built first and reported in its own column: it is kept between requests and
+grows with the vocabulary, not with the number of artworks.
+
+    python benchmarks/bench_streaming_memory.py --sizes 2000 10000 40000
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import Config  # noqa: E402
+from bench_recommendations import synthetic_artworks  # noqa: E402
+
+
+def fill(db, records, start, blob_bytes):
+    from app.features import FEATURE_VERSION, pack_histogram
+    from app.models import Artwork, ArtworkFeature
+
+    blob = os.urandom(blob_bytes)
+    for offset in range(0, len(records), 1000):
+        chunk = records[offset:offset + 1000]
+        db.session.bulk_insert_mappings(Artwork, [
+            {
+                "id": start + i, "name": r.name, "artist": r.artist, "style": r.style,
+                "medium": r.medium, "artwork_type": r.artwork_type, "description": r.description,
+                "image_data": blob, "filename": f"{start + i}.png",
+            }
+            for i, r in enumerate(chunk, offset)
+        ])
+        db.session.bulk_insert_mappings(ArtworkFeature, [
+            {"artwork_id": start + i, "version": FEATURE_VERSION, "histogram": pack_histogram(r.histogram)}
+            for i, r in enumerate(chunk, offset)
+        ])
+        db.session.commit()
+
+
+def peak_of(fn):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / (1 << 20), elapsed * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2000, 10000, 40000])
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--top-n", type=int, default=6)
+    parser.add_argument("--text-scoring", choices=("jaccard", "tfidf"), default="jaccard")
+    parser.add_argument("--blob-kb", type=int, default=64, help="image blob stored per artwork")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    Config.SQLALCHEMY_DATABASE_URI = "sqlite:///" + os.path.join(tmp, "bench.db")
+    Config.SIMILARITY_REFRESH_ENABLED = False
+
+    from app import create_app
+    from app.extensions import db
+    from app.similarity import build_engine, recommend_streaming
+    from app.text_index import get_document_frequencies
+
+    app = create_app()
+    records = synthetic_artworks(max(args.sizes))
+    peaks = []
+    print(f"{'artworks':>9} {'stream MiB':>11} {'stream ms':>10} {'df MiB':>8} {'engine MiB':>11}")
+    with app.app_context():
+        filled = 0
+        for n in sorted(args.sizes):
+            fill(db, records[filled:n], filled + 1, args.blob_kb << 10)
+            filled = n
+            df_mib = 0.0
+            if args.text_scoring == "tfidf":
+                df_mib, _ = peak_of(lambda: get_document_frequencies(n))
+
+            def query():
+                recommend_streaming(
+                    1, top_n=args.top_n, text_scoring=args.text_scoring,
+                    chunk_size=args.chunk_size, catalog_version=n,
+                )
+
+            stream_mib, stream_ms = peak_of(query)
+            engine_mib, _ = peak_of(lambda: build_engine(n))
+            peaks.append(stream_mib)
+            print(f"{n:>9} {stream_mib:>11.2f} {stream_ms:>10.1f} {df_mib:>8.2f} {engine_mib:>11.2f}")
+
+    growth = peaks[-1] / peaks[0]
+    print(f"streaming peak growth: {growth:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Benchmark: on-demand thumbnails and WebP/AVIF variants.
+
+For synthetic photo-like JPEGs, reports per width (and at full size) and per
+output format the mean size, the bytes saved against the original and the
+time to generate the variant, then the cost of a cache hit. Finally checks
+single flight: many threads asking for the same missing derivative must run
+the generator exactly once (exits 1 if not).
+
+    python benchmarks/bench_thumbnails.py --images 5 --size 3000x2000
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.derivatives import DerivativeCache  # noqa: E402
+from app.thumbnails import available_formats, get_image_variant  # noqa: E402
+
+WIDTHS = [160, 320, 640, 1280, None]
+
+
+def synthetic_jpeg(path, width, height, seed):
+    """Smooth gradients plus noise, so the JPEG compresses like a photo."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack([
+        128 + 100 * np.sin(x / rng.uniform(50, 400)),
+        128 + 100 * np.cos(y / rng.uniform(50, 400)),
+        128 + 100 * np.sin((x + y) / rng.uniform(50, 400)),
+    ], axis=-1)
+    pixels = np.clip(base + rng.normal(0, 12, base.shape), 0, 255).astype(np.uint8)
+    Image.fromarray(pixels).save(path, "JPEG", quality=92)
+
+
+def single_flight(root, threads=16):
+    cache = DerivativeCache(root, 1 << 30)
+    calls = []
+    start = threading.Barrier(threads)
+
+    def generate():
+        calls.append(1)
+        time.sleep(0.2)  # a slow render, so every thread arrives while it runs
+        return b"x" * 1000
+
+    def worker():
+        start.wait()
+        cache.get_or_create("ff-single-flight", generate)
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return len(calls)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=5)
+    parser.add_argument("--size", default="3000x2000", help="original WIDTHxHEIGHT")
+    args = parser.parse_args()
+    width, height = (int(v) for v in args.size.split("x"))
+
+    tmp = tempfile.mkdtemp()
+    config = {"DERIVATIVE_CACHE_ROOT": os.path.join(tmp, "derivatives"), "THUMBNAIL_QUALITY": 82}
+    sources = []
+    for i in range(args.images):
+        path = os.path.join(tmp, f"original-{i}.jpg")
+        synthetic_jpeg(path, width, height, seed=i)
+        sources.append((f"{i:064x}", path))
+    original = sum(os.path.getsize(path) for _, path in sources) / len(sources)
+
+    formats = [None] + available_formats()
+    print(f"{args.images} images, {width}x{height}, mean original {original / 1024:.0f} KiB")
+    print(f"{'width':>6} {'format':>6} {'KiB':>8} {'saved':>7} {'gen ms':>8} {'hit ms':>8}")
+    for w in WIDTHS:
+        for fmt in formats:
+            if w is None and fmt is None:
+                continue
+            size = gen_ms = 0.0
+            for digest, path in sources:
+                variant_path, _, _, ms = get_image_variant(digest, path, config, w, fmt)
+                size += os.path.getsize(variant_path)
+                gen_ms += ms
+            t0 = time.perf_counter()
+            for digest, path in sources:
+                get_image_variant(digest, path, config, w, fmt)
+            hit_ms = (time.perf_counter() - t0) * 1000 / len(sources)
+            size /= len(sources)
+            print(f"{w or 'full':>6} {fmt or 'jpeg':>6} {size / 1024:>8.1f} {1 - size / original:>7.1%} "
+                  f"{gen_ms / len(sources):>8.1f} {hit_ms:>8.3f}")
+
+    calls = single_flight(os.path.join(tmp, "single-flight"))
+    print(f"single flight: 16 concurrent misses -> {calls} generation(s)")
+    if calls != 1:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -67,7 +67,18 @@ export default function ARViewer() {
     if (!artwork || !viewerRef.current) return;
 
     const viewer = viewerRef.current;
-    const glbUrl = `${API_BASE}/artwork/${artwork.id}/glb`;
+    // <model-viewer> cannot send client-hint headers, so ask for a lighter
+    // level of detail explicitly on phones and slow connections
+    const connection = navigator.connection?.effectiveType;
+    const mobile = /Android|webOS|iPhone|iPad|iPod|BlackBerry|IEMobile|Opera Mini/i.test(navigator.userAgent);
+    const lod = connection === 'slow-2g' || connection === '2g' ? 512 : (connection === '3g' || mobile ? 1024 : null);
+    const params = [];
+    if (lod) params.push(`lod=${lod}`);
+    // show the painting at its listed size rather than the default 0.6 m frame
+    if (artwork.dimensions) params.push('width_m=actual');
+    const glbPath = artwork.glb_url || `/artwork/${artwork.id}/glb`;
+    const query = params.length ? `${glbPath.includes('?') ? '&' : '?'}${params.join('&')}` : '';
+    const glbUrl = `${API_BASE}${glbPath}${query}`;
     viewer.src = glbUrl;
 
     const onLoad = () => {
@@ -100,7 +100,7 @@ export default function ArtworkDetail() {
           <div className="artwork-grid">
             <div className="artwork-image-container">
               <img
-                src={`${API_BASE}/artwork/${artwork.id}/image`}
+                src={`${API_BASE}${artwork.image_url || `/artwork/${artwork.id}/image`}`}
                 alt={artwork.name}
                 className="artwork-image"
               />
@@ -160,7 +160,7 @@ export default function ArtworkDetail() {
                 <button type="button" className="btn" onClick={handleViewAR}>
                   🥽 Experience in AR
                 </button>
-                <a href={`${API_BASE}/artwork/${artwork.id}/glb`} className="btn btn-secondary" download>
+                <a href={`${API_BASE}${artwork.glb_url || `/artwork/${artwork.id}/glb`}`} className="btn btn-secondary" download>
                   📥 Download 3D Model
                 </a>
               </div>
@@ -131,7 +131,12 @@ export default function Buyer() {
   const startIndex = (currentPage - 1) * itemsPerPage;
   const currentArtworks = filteredArtworks.slice(startIndex, startIndex + itemsPerPage);
 
-  const imgUrl = (id) => `${API_BASE}/artwork/${id}/image`;
+  // image_url carries the content hash, so the browser can cache it for good;
+  // `width` asks the server for a resized copy
+  const imgUrl = (artwork, width) => {
+    const url = artwork.image_url || `/artwork/${artwork.id}/image`;
+    return `${API_BASE}${url}${width ? `${url.includes('?') ? '&' : '?'}w=${width}` : ''}`;
+  };
 
   // ✅ RAZORPAY CHECKOUT (1 artwork at a time)
   const handleCheckout = async () => {
@@ -339,7 +344,7 @@ export default function Buyer() {
             <div className={viewMode === 'grid' ? 'buyer-grid' : 'buyer-list'}>
               {currentArtworks.map((artwork) => (
                 <div key={artwork.id} className="buyer-card">
-                  <img src={imgUrl(artwork.id)} alt={artwork.name} className="card-image" />
+                  <img src={imgUrl(artwork, 640)} alt={artwork.name} className="card-image" />
 
                   <div className="card-content">
                     <h3 className="card-title">{artwork.name}</h3>
@@ -425,7 +430,7 @@ export default function Buyer() {
                   <div className="cart-items">
                     {cart.map((item) => (
                       <div key={item.id} className="cart-item">
-                        <img src={imgUrl(item.id)} alt={item.name} className="cart-item-image" />
+                        <img src={imgUrl(item, 160)} alt={item.name} className="cart-item-image" />
 
                         <div className="cart-item-details">
                           <h4>{item.name}</h4>
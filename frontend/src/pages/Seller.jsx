@@ -49,6 +49,27 @@ export default function Seller() {
 
   useEffect(() => loadArtworks(), []);
 
+  const waitForJob = async (statusUrl, attempt = 0) => {
+    await new Promise((resolve) => setTimeout(resolve, Math.min(1000 * 2 ** attempt, 10000)));
+    try {
+      const res = await fetch(`${API_BASE}${statusUrl}`, { credentials: 'include' });
+      const data = await res.json();
+      const job = data.job || {};
+      if (job.status === 'done') {
+        showMessage(setListStatus, '3D model ready!', 'success');
+        loadArtworks();
+        return;
+      }
+      if (job.status === 'failed') {
+        showMessage(setListStatus, job.error || 'Failed to build the 3D model', 'error');
+        return;
+      }
+    } catch (err) {
+      // keep polling through transient errors
+    }
+    if (attempt < 20) waitForJob(statusUrl, attempt + 1);
+  };
+
   const handleCreate = async (e) => {
     e.preventDefault();
     const form = e.target;
@@ -89,12 +110,19 @@ export default function Seller() {
       const data = await res.json().catch(() => ({}));
       if (!res.ok) throw new Error(data.error || 'Failed to create artwork');
 
-      showMessage(setCreateStatus, 'Artwork created successfully!', 'success');
       form.reset();
       setShowCreate(false);
 
       // reload seller artworks
       loadArtworks();
+
+      if (res.status === 202 && data.status_url) {
+        // the 3D model is built in the background; reload once it is ready
+        showMessage(setListStatus, 'Artwork uploaded. Building its 3D model...', 'success');
+        waitForJob(data.status_url);
+      } else {
+        showMessage(setCreateStatus, 'Artwork created successfully!', 'success');
+      }
     } catch (err) {
       showMessage(setCreateStatus, err.message, 'error');
     } finally {
@@ -311,7 +339,7 @@ export default function Seller() {
                 <div key={artwork.id} className="artwork-card">
                   <div className={`artwork-image-wrap ${artwork.is_sold ? "sold" : ""}`}>
                     <img
-                      src={`${API_BASE}/artwork/${artwork.id}/image`}
+                      src={`${API_BASE}${artwork.image_url || `/artwork/${artwork.id}/image`}${artwork.image_url?.includes('?') ? '&' : '?'}w=640`}
                       alt={artwork.name}
                       className="artwork-image"
                     />
@@ -3,9 +3,9 @@ from dotenv import load_dotenv
 load_dotenv()
 from app import create_app
 
-app = create_app()
-
 if __name__ == "__main__":
+    # built here, not at import: GLB job pool processes re-import this script
+    app = create_app(start_background=True)
     port = int(os.environ.get("PORT", 5000))
     debug = os.environ.get("FLASK_DEBUG", "true").lower() in ("1", "true", "yes")
     app.run(host="0.0.0.0", port=port, debug=debug)
@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# the app, and the synthetic data the benchmarks generate
+sys.path[:0] = [ROOT, os.path.join(ROOT, "benchmarks")]
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """The app on a throwaway SQLite database and stores, with no background threads."""
+    from app.config import Config
+
+    monkeypatch.setattr(Config, "SQLALCHEMY_DATABASE_URI", "sqlite:///" + str(tmp_path / "test.db"))
+    monkeypatch.setattr(Config, "BLOB_STORE_ROOT", str(tmp_path / "blobs"))
+    monkeypatch.setattr(Config, "DERIVATIVE_CACHE_ROOT", str(tmp_path / "derivatives"))
+
+    from app import create_app
+
+    return create_app()
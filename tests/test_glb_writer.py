@@ -0,0 +1,72 @@
+import io
+import json
+import struct
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from bench_glb_writer import synthetic_jpeg, trimesh_glb
+
+from app.glb import prepare_texture, write_box_glb
+
+trimesh = pytest.importorskip("trimesh")
+
+POLICY = {"max_side": 2048, "format": "auto", "quality": 85}
+BOXES = [(0.6, 0.4, 0.01), (1.2, 0.8, 0.03), (0.3, 0.9, 0.005)]
+
+
+@pytest.fixture(scope="module")
+def texture():
+    upload = synthetic_jpeg(800, 600)
+    data, mimetype, _, _ = prepare_texture(Image.open(io.BytesIO(upload)), POLICY)
+    return data, mimetype
+
+
+def load_mesh(glb):
+    scene = trimesh.load(io.BytesIO(glb), file_type="glb", process=False)
+    return list(scene.geometry.values())[0]
+
+
+def faces(mesh):
+    """{facing: corner positions} per box face, positions rounded to 0.1 mm.
+
+    Compared per face rather than per triangle: which diagonal splits each
+    quad is arbitrary and renders the same.
+    """
+    corners = np.round(mesh.vertices[mesh.faces], 4)
+    facing = np.sign(np.round(np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0]), 6))
+    result = {}
+    for tri, n in zip(corners.tolist(), facing.tolist()):
+        result.setdefault(tuple(n), set()).update(map(tuple, tri))
+    return result
+
+
+def uv_by_position(mesh):
+    # trimesh flips v on load, so both files come back in the same convention
+    return {
+        tuple(np.round(p, 4)): tuple(np.round(uv, 4))
+        for p, uv in zip(mesh.vertices.tolist(), mesh.visual.uv.tolist())
+    }
+
+
+def embedded_texture(glb):
+    json_length = struct.unpack_from("<I", glb, 12)[0]
+    tree = json.loads(glb[20:20 + json_length])
+    view = tree["bufferViews"][tree["images"][0]["bufferView"]]
+    start = 28 + json_length + view["byteOffset"]
+    return glb[start:start + view["byteLength"]]
+
+
+@pytest.mark.parametrize("box", BOXES)
+def test_direct_writer_matches_trimesh_export(texture, box):
+    data, mimetype = texture
+    ours = write_box_glb(*box, data, mimetype)
+    a, b = load_mesh(ours), load_mesh(trimesh_glb(*box, data))
+
+    assert np.allclose(a.bounds, b.bounds, atol=1e-6)
+    assert faces(a) == faces(b)
+    # a positive, equal volume means both wind their triangles outwards
+    assert np.isclose(a.area, b.area) and np.isclose(a.volume, b.volume)
+    assert uv_by_position(a) == uv_by_position(b)
+    assert embedded_texture(ours) == data, "the direct writer re-encoded the texture"
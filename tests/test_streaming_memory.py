@@ -0,0 +1,35 @@
+import tracemalloc
+
+from bench_recommendations import synthetic_artworks
+from bench_streaming_memory import fill
+
+from app.extensions import db
+from app.similarity import recommend_streaming
+
+SIZES = (1000, 5000)
+CHUNK_SIZE = 250
+MAX_GROWTH = 1.5
+
+
+def streaming_peak(catalog_version):
+    tracemalloc.start()
+    recs = recommend_streaming(1, top_n=6, chunk_size=CHUNK_SIZE, catalog_version=catalog_version)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(recs) == 6
+    return peak
+
+
+def test_streaming_peak_does_not_grow_with_the_catalog(app):
+    records = synthetic_artworks(max(SIZES))
+    peaks = []
+    with app.app_context():
+        filled = 0
+        for n in SIZES:
+            # each artwork carries an image blob, which the scan must never load
+            fill(db, records[filled:n], filled + 1, 16 << 10)
+            filled = n
+            peaks.append(streaming_peak(n))
+
+    growth = peaks[-1] / peaks[0]
+    assert growth <= MAX_GROWTH, f"streaming peak grew {growth:.2f}x from {SIZES[0]} to {SIZES[-1]} artworks"
@@ -1,4 +1,10 @@
-from app import app
+from dotenv import load_dotenv
+load_dotenv()
+from app import create_app
+
+# gunicorn imports this in each worker: the serving processes, so they run the
+# background threads (see create_app)
+app = create_app(start_background=True)
 
 if __name__ == "__main__":
     app.run()